@@ -1,6 +1,8 @@
 
 
 import os
+import logging
+import io
 import json
 import asyncio
 import shlex
@@ -9,11 +11,18 @@ import sys
 import traceback
 import uuid
 import shutil
+import signal
+import functools
+import hashlib
 import time
+import base64
+import httpx
+import orjson
+from collections import OrderedDict
 from contextlib import AsyncExitStack
 from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, ORJSONResponse, Response, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -21,6 +30,9 @@ from dotenv import load_dotenv
 # --- Database Import ---
 from database import init_db, ChatDatabase
 
+# --- LLM Response Cache ---
+import llm_cache
+
 # --- MCP Imports ---
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -35,7 +47,7 @@ from mcp.shared.exceptions import McpError
 from mcp.client.streamable_http import streamable_http_client
 
 # --- Groq SDK Imports ---
-from groq import Groq, AsyncGroq
+from groq import Groq, AsyncGroq, DefaultAsyncHttpxClient
 
 # --- Google GenAI SDK Imports ---
 from google import genai
@@ -51,15 +63,34 @@ from logger import (
     log_session_event,
     log_startup_info,
     log_exception,
-    log_execution_time
+    log_execution_time,
+    stop_log_listener
 )
 
 MAX_TOOL_RESULT_LENGTH = 8000  # Characters (about 2000 tokens)
+MAX_CONCURRENT_PER_SERVER = int(os.environ.get("MCP_MAX_CONCURRENT_PER_SERVER", "8"))
+_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9_]')
+_TOOL_OUT_RE = re.compile(r"Tool '([^']+)' Output:")
+
+# asyncio.timeout (3.11+) avoids the extra Task wait_for creates per call
+_asyncio_timeout = getattr(asyncio, "timeout", None)
+
+# Faster event loop for all the small I/O tasks (MCP RPCs, SSE, LLM calls)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
 load_dotenv()
+
+# Environment for stdio servers, built once after .env is loaded. Treat as
+# read-only: it is shared by every connection.
+_BASE_ENV = {**os.environ, "PYTHONUNBUFFERED": "1"}
+
 init_db()
 db = ChatDatabase()
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -82,10 +113,23 @@ GROQ_MODEL = "llama-3.3-70b-versatile"
 groq_client = None
 groq_async_client = None
 
+# Keep TLS connections to the LLM APIs open between chat turns so a request
+# doesn't pay for a fresh handshake. HTTP/2 needs the optional h2 package.
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+LLM_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60)
+LLM_KEEPALIVE_INTERVAL = float(os.environ.get("LLM_KEEPALIVE_INTERVAL", "45"))  # Seconds, 0 = only warm up at startup
+
 try:
     if GROQ_API_KEY:
         groq_client = Groq(api_key=GROQ_API_KEY)
-        groq_async_client = AsyncGroq(api_key=GROQ_API_KEY)
+        groq_async_client = AsyncGroq(
+            api_key=GROQ_API_KEY,
+            http_client=DefaultAsyncHttpxClient(http2=HTTP2_AVAILABLE, limits=LLM_HTTP_LIMITS)
+        )
         logger.info(f"Groq client initialized successfully", extra={
             "extra_data": {"model": GROQ_MODEL}
         })
@@ -131,6 +175,15 @@ log_startup_info(
     }
 )
 
+def get_groq_async():
+    """Shared AsyncGroq client. Handlers must use this instead of building
+    their own client so the underlying HTTP connection pool is reused."""
+    return groq_async_client
+
+def get_gemini():
+    """Shared Gemini client (see get_groq_async)."""
+    return gemini_client
+
 if not ACTIVE_PROVIDER:
     logger.critical("No LLM provider available! Please configure GROQ_API_KEY or GOOGLE_API_KEY/GOOGLE_CLOUD_PROJECT")
 
@@ -142,6 +195,9 @@ class ConnectRequest(BaseModel):
     target: str
     type: str
 
+class ConnectBatchRequest(BaseModel):
+    connections: List[ConnectRequest]
+
 class ChatRequest(BaseModel):
     session_id: str
     new_message: Dict[str, Any]
@@ -153,6 +209,12 @@ class ExecuteToolRequest(BaseModel):
     tool_name: str
     tool_args: Dict[str, Any]
 
+class BatchExecuteToolRequest(BaseModel):
+    session_id: str
+    calls: List[ExecuteToolRequest]
+    max_concurrent: int = 8
+    stop_on_error: bool = False
+
 class CreateSessionRequest(BaseModel):
     title: str
 
@@ -172,6 +234,160 @@ class GetPromptRequest(BaseModel):
 # ==========================================
 # 1. CHAT CONNECTION MANAGER (MCP)
 # ==========================================
+# Identical schemas from duplicate connections share one dict instance.
+# Entries are [schema, refcount]; connections release theirs on disconnect.
+_SCHEMA_INTERN: Dict[str, list] = {}
+
+def _intern_schema(schema: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
+    """Return the shared instance of schema, recording its key in keys."""
+    try:
+        key = hashlib.blake2b(
+            orjson.dumps(schema, option=orjson.OPT_SORT_KEYS), digest_size=16
+        ).hexdigest()
+    except TypeError:
+        return schema
+    entry = _SCHEMA_INTERN.get(key)
+    if entry is None:
+        entry = _SCHEMA_INTERN[key] = [schema, 0]
+    entry[1] += 1
+    keys.append(key)
+    return entry[0]
+
+def _release_schemas(keys: List[str]):
+    for key in keys:
+        entry = _SCHEMA_INTERN.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del _SCHEMA_INTERN[key]
+    keys.clear()
+
+_GEMINI_SCHEMA_BLACKLIST = frozenset(('title', '$schema', 'additionalProperties', 'default'))
+_CLEAN_SCHEMA_CACHE: Dict[int, tuple] = {}
+_CLEAN_SCHEMA_CACHE_SIZE = 512
+
+def _clean_schema(schema: Any) -> Any:
+    """Strip keys Gemini rejects; returns the input unchanged if already clean."""
+    if not isinstance(schema, dict):
+        return schema
+
+    props = schema.get('properties')
+    new_props = None
+    if props:
+        cleaned = {k: _clean_schema(v) for k, v in props.items()}
+        if any(cleaned[k] is not props[k] for k in props):
+            new_props = cleaned
+
+    items = schema.get('items')
+    new_items = _clean_schema(items) if 'items' in schema else items
+
+    if ('type' in schema and new_props is None and new_items is items
+            and _GEMINI_SCHEMA_BLACKLIST.isdisjoint(schema)):
+        return schema
+
+    out = {k: v for k, v in schema.items() if k not in _GEMINI_SCHEMA_BLACKLIST}
+    if 'type' not in out:
+        out['type'] = 'object' if 'properties' in out else 'string'
+    if new_props is not None:
+        out['properties'] = new_props
+    if 'items' in out:
+        out['items'] = new_items
+    return out
+
+def clean_schema(schema: Any) -> Any:
+    """Gemini-compatible copy of a tool schema, memoized per schema object.
+
+    Schemas are not mutated during a connection's lifetime, so the cache is
+    keyed on identity; the entry holds a reference to keep the id stable.
+    """
+    if not isinstance(schema, dict):
+        return schema
+    cached = _CLEAN_SCHEMA_CACHE.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    cleaned = _clean_schema(schema)
+    if len(_CLEAN_SCHEMA_CACHE) >= _CLEAN_SCHEMA_CACHE_SIZE:
+        _CLEAN_SCHEMA_CACHE.pop(next(iter(_CLEAN_SCHEMA_CACHE)))
+    _CLEAN_SCHEMA_CACHE[id(schema)] = (schema, cleaned)
+    return cleaned
+
+@functools.lru_cache(maxsize=256)
+def _resolve_script(script_name: str, cwd: str) -> str:
+    """Locate a Python script relative to cwd. Cached; see _clear_path_caches."""
+    search_paths = [
+        script_name if os.path.isabs(script_name) else None,
+        os.path.join(cwd, script_name),
+        os.path.join(cwd, os.path.basename(script_name)),
+        os.path.join(cwd, 'backend', script_name),
+        os.path.join(os.path.dirname(cwd), script_name),
+        os.path.join(os.path.dirname(cwd), 'backend', script_name),
+        os.path.basename(script_name),
+    ]
+    
+    for path in search_paths:
+        if path and os.path.exists(path):
+            abs_path = os.path.abspath(path)
+            logger.debug("Found script at: %s", abs_path)
+            return abs_path
+    
+    logger.error("Script not found", extra={
+        "extra_data": {
+            "script_name": script_name,
+            "cwd": cwd,
+            "searched_paths": [p for p in search_paths if p]
+        }
+    })
+    
+    raise FileNotFoundError(
+        f"Could not find script '{script_name}'. "
+        f"Current directory: {cwd}. "
+        f"Try using the full filename like 'tools_server.py'"
+    )
+
+_which_cached = functools.lru_cache(maxsize=128)(shutil.which)
+
+@functools.lru_cache(maxsize=64)
+def _resolve_command(target: str) -> tuple:
+    """Split a command line and resolve its executable on PATH.
+    Returns (command, args) with args as a tuple; cached like _which_cached."""
+    parts = shlex.split(target, posix=sys.platform != "win32")
+    return _which_cached(parts[0]) or parts[0], tuple(parts[1:])
+
+def _clear_path_caches(*_):
+    """Drop cached script/PATH lookups (e.g. after installing a new server)."""
+    _resolve_script.cache_clear()
+    _which_cached.cache_clear()
+    _resolve_command.cache_clear()
+    logger.info("Cleared script and command path caches")
+
+if hasattr(signal, "SIGHUP"):
+    try:
+        signal.signal(signal.SIGHUP, _clear_path_caches)
+    except ValueError:
+        # Not on the main thread; the admin endpoint still works
+        pass
+
+def _iter_tool_output(result: CallToolResult):
+    """Yield the text rendering of each part of a tool result."""
+    if hasattr(result, "structuredContent") and result.structuredContent:
+        try:
+            yield orjson.dumps(result.structuredContent, option=orjson.OPT_INDENT_2).decode()
+        except TypeError:
+            # orjson rejects some valid JSON-able values (huge ints, non-str keys)
+            yield json.dumps(result.structuredContent, indent=2)
+
+    if result.content:
+        for content in result.content:
+            if isinstance(content, TextContent):
+                yield content.text
+            elif isinstance(content, ImageContent):
+                yield f"[Image Returned: {content.mimeType}]"
+            elif isinstance(content, EmbeddedResource):
+                yield f"[Resource Embedded: {content.resource.uri}]"
+            else:
+                yield str(content)
+
 class MCPConnection:
     def __init__(self, name: str, session: ClientSession, exit_stack: AsyncExitStack, 
                  tools: List[Any], resources: List[Any], prompts: List[Any]):
@@ -181,10 +397,60 @@ class MCPConnection:
         self.tools = tools
         self.resources = resources
         self.prompts = prompts
+        # Bounds in-flight tool calls so bursts don't flood one server's pipe
+        self.sem = asyncio.Semaphore(MAX_CONCURRENT_PER_SERVER)
+
+        # Tool list is fixed for the life of the connection, so build the
+        # LLM-facing definitions and name mapping once here.
+        self.sanitized_tools: List[Dict[str, Any]] = []
+        self.local_tool_map: Dict[str, Dict[str, Any]] = {}
+        self.schema_keys: List[str] = []
+        for tool in tools:
+            raw_name = f"{name}__{tool.name}"
+            sanitized_name = _SANITIZE_RE.sub('_', raw_name)
+            if not sanitized_name[0].isalpha():
+                sanitized_name = f"action_{sanitized_name}"
+            sanitized_name = sanitized_name[:63]
+
+            # Only calls the server declares side-effect free may share a
+            # result; e.g. a password generator must run once per caller
+            annotations = getattr(tool, "annotations", None)
+            shareable = bool(annotations and (
+                getattr(annotations, "readOnlyHint", None) or getattr(annotations, "idempotentHint", None)
+            ))
+
+            self.local_tool_map[sanitized_name] = {
+                "connection_id": name, "real_name": tool.name, "shareable": shareable
+            }
+
+            self.sanitized_tools.append({
+                "name": sanitized_name,
+                "description": sys.intern(tool.description[:1024]) if tool.description else "No description",
+                "parameters": _intern_schema(tool.inputSchema, self.schema_keys) if isinstance(tool.inputSchema, dict) else {}
+            })
 
 class ConnectionManager:
     def __init__(self):
         self.connections: Dict[str, MCPConnection] = {}
+        # Everything derived from the tool set (listings, provider formats,
+        # prompts) only changes on connect/disconnect; see memo()
+        self._snapshots: Dict[Any, Any] = {}
+        # Bumped whenever the connected tool set changes
+        self.tools_version = 0
+        # Identical tool calls currently running, keyed by target + canonical args
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+
+    def _invalidate_tool_caches(self):
+        self.tools_version += 1
+        self._snapshots = {}
+
+    def memo(self, key: Any, build):
+        """Value for key derived from the current tool set, built once per
+        tools_version. This is the single cache for tool-derived data."""
+        snapshots = self._snapshots
+        if key not in snapshots:
+            snapshots[key] = build()
+        return snapshots[key]
 
     async def connect(self, connection_id: str, target: str, type: str):
         start_time = time.time()
@@ -229,8 +495,7 @@ class ConnectionManager:
             if type == "stdio":
                 command = ""
                 args = []
-                env = os.environ.copy()
-                env["PYTHONUNBUFFERED"] = "1"
+                env = _BASE_ENV
 
                 # Check if target ends with .py (it's a script path)
                 if target.endswith(".py"):
@@ -238,9 +503,10 @@ class ConnectionManager:
                         script_path = self._find_script(target)
                         command = sys.executable
                         args = [script_path]
-                        logger.debug(f"Launching local Python script", extra={
-                            "extra_data": {"command": command, "script": script_path}
-                        })
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"Launching local Python script", extra={
+                                "extra_data": {"command": command, "script": script_path}
+                            })
                     except FileNotFoundError as e:
                         logger.error(f"Script not found: {target}")
                         raise HTTPException(status_code=400, detail=str(e))
@@ -269,15 +535,16 @@ class ConnectionManager:
                                 raise HTTPException(status_code=400, detail=str(e))
                     else:
                         cmd_name = parts[0]
-                        full_cmd_path = shutil.which(cmd_name)
+                        full_cmd_path = _which_cached(cmd_name)
                         if not full_cmd_path:
                             logger.warning(f"Command '{cmd_name}' not found in PATH, attempting to use as-is")
                         command = full_cmd_path if full_cmd_path else cmd_name
                         args = parts[1:]
                     
-                    logger.debug(f"Launching command", extra={
-                        "extra_data": {"command": command, "args": args}
-                    })
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Launching command", extra={
+                            "extra_data": {"command": command, "args": args}
+                        })
 
                 server_params = StdioServerParameters(command=command, args=args, env=env)
                 
@@ -291,7 +558,6 @@ class ConnectionManager:
                         status_code=500, 
                         detail=f"Failed to start server: {str(e)}\nCommand: {command} {' '.join(args)}"
                     )
-                read, write = await exit_stack.enter_async_context(stdio_client(server_params))
             
             elif type == "sse":
                 logger.debug(f"Establishing SSE connection to {target}")
@@ -332,9 +598,12 @@ class ConnectionManager:
                 session = await exit_stack.enter_async_context(ClientSession(read, write))
                 
                 # Add timeout for initialization
-                import asyncio
                 try:
-                    await asyncio.wait_for(session.initialize(), timeout=30.0)
+                    if _asyncio_timeout is not None:
+                        async with _asyncio_timeout(30.0):
+                            await session.initialize()
+                    else:
+                        await asyncio.wait_for(session.initialize(), timeout=30.0)
                 except asyncio.TimeoutError:
                     raise HTTPException(
                         status_code=504,
@@ -352,32 +621,45 @@ class ConnectionManager:
                     detail=f"Failed to initialize MCP session: {str(e)}"
                 )
             
+            # Discovery RPCs are independent; run them concurrently. Each
+            # capability is optional, so a failure just yields an empty list.
+            tools_r, resources_r, prompts_r = await asyncio.gather(
+                session.list_tools(),
+                session.list_resources(),
+                session.list_prompts(),
+                return_exceptions=True
+            )
+
             fetched_tools, fetched_resources, fetched_prompts = [], [], []
-            try:
-                fetched_tools = (await session.list_tools()).tools
-            except Exception as e:
+            if isinstance(tools_r, Exception):
                 logger.warning(f"Could not fetch tools", extra={
-                    "extra_data": {"connection_id": connection_id, "error": str(e)}
+                    "extra_data": {"connection_id": connection_id, "error": str(tools_r)}
                 })
-            
-            try:
-                fetched_resources = (await session.list_resources()).resources
-            except Exception as e:
+            else:
+                fetched_tools = tools_r.tools
+
+            if isinstance(resources_r, Exception):
                 logger.warning(f"Could not fetch resources", extra={
-                    "extra_data": {"connection_id": connection_id, "error": str(e)}
+                    "extra_data": {"connection_id": connection_id, "error": str(resources_r)}
                 })
-            
-            try:
-                fetched_prompts = (await session.list_prompts()).prompts
-            except Exception as e:
+            else:
+                fetched_resources = resources_r.resources
+
+            if isinstance(prompts_r, Exception):
                 logger.warning(f"Could not fetch prompts", extra={
-                    "extra_data": {"connection_id": connection_id, "error": str(e)}
+                    "extra_data": {"connection_id": connection_id, "error": str(prompts_r)}
                 })
+            else:
+                fetched_prompts = prompts_r.prompts
 
+            replaced = self.connections.get(connection_id)
+            if replaced is not None:
+                _release_schemas(replaced.schema_keys)
             self.connections[connection_id] = MCPConnection(
                 name=connection_id, session=session, exit_stack=exit_stack,
                 tools=fetched_tools, resources=fetched_resources, prompts=fetched_prompts
             )
+            self._invalidate_tool_caches()
             
             duration = time.time() - start_time
             
@@ -412,79 +694,83 @@ class ConnectionManager:
                 duration=duration
             )
             
-            logger.error("Connection failed", extra={
-                "extra_data": {
-                    "connection_id": connection_id,
-                    "traceback": traceback.format_exc()
-                }
-            })
+            # Formatting the traceback is costly; only do it when debug
+            # output is actually being captured
+            extra_data = {"connection_id": connection_id}
+            if logger.isEnabledFor(logging.DEBUG):
+                extra_data["traceback"] = traceback.format_exc()
+            logger.error("Connection failed", extra={"extra_data": extra_data})
             
             raise HTTPException(status_code=500, detail=f"Connection Failed: {str(e)}")
 
+    async def connect_many(self, specs: List[ConnectRequest]):
+        """Connect to several MCP servers concurrently.
+
+        Each connection owns its own AsyncExitStack, so one failure does not
+        tear down its peers. Results are returned in input order; failed
+        entries are the raised exceptions.
+        """
+        return await asyncio.gather(
+            *(self.connect(s.id, s.target, s.type) for s in specs),
+            return_exceptions=True
+        )
+
     def _find_script(self, script_name: str) -> str:
         """Intelligently find a Python script in multiple locations."""
-        cwd = os.getcwd()
-        
-        search_paths = [
-            script_name if os.path.isabs(script_name) else None,
-            os.path.join(cwd, script_name),
-            os.path.join(cwd, os.path.basename(script_name)),
-            os.path.join(cwd, 'backend', script_name),
-            os.path.join(os.path.dirname(cwd), script_name),
-            os.path.join(os.path.dirname(cwd), 'backend', script_name),
-            os.path.basename(script_name),
-        ]
-        
-        for path in search_paths:
-            if path and os.path.exists(path):
-                abs_path = os.path.abspath(path)
-                logger.debug(f"Found script at: {abs_path}")
-                return abs_path
-        
-        logger.error(f"Script not found", extra={
-            "extra_data": {
-                "script_name": script_name,
-                "cwd": cwd,
-                "searched_paths": [p for p in search_paths if p]
-            }
-        })
-        
-        raise FileNotFoundError(
-            f"Could not find script '{script_name}'. "
-            f"Current directory: {cwd}. "
-            f"Try using the full filename like 'tools_server.py'"
-        )
+        return _resolve_script(script_name, os.getcwd())
 
     async def disconnect(self, connection_id: str):
         if connection_id in self.connections:
-            await self.connections[connection_id].exit_stack.aclose()
-            del self.connections[connection_id]
+            conn = self.connections.pop(connection_id)
+            _release_schemas(conn.schema_keys)
+            await conn.exit_stack.aclose()
+            self._invalidate_tool_caches()
             logger.info(f"Disconnected from MCP server: {connection_id}")
 
     def get_all_tools(self):
+        return self.memo("all_tools", self._collect_tools)
+
+    def _collect_tools(self):
         all_tools = []
         tool_map = {}
        
-        for conn_id, conn in self.connections.items():
-            for tool in conn.tools:
-                raw_name = f"{conn_id}__{tool.name}"
-                sanitized_name = re.sub(r'[^a-zA-Z0-9_]', '_', raw_name)
-                if not sanitized_name[0].isalpha():
-                    sanitized_name = f"action_{sanitized_name}"
-                sanitized_name = sanitized_name[:63]
-               
-                tool_map[sanitized_name] = {"connection_id": conn_id, "real_name": tool.name}
-                
-                tool_def = {
-                    "name": sanitized_name,
-                    "description": tool.description[:1024] if tool.description else "No description",
-                    "parameters": tool.inputSchema if isinstance(tool.inputSchema, dict) else {}
-                }
-                all_tools.append(tool_def)
+        for conn in self.connections.values():
+            all_tools.extend(conn.sanitized_tools)
+            tool_map.update(conn.local_tool_map)
         
-        logger.debug(f"Retrieved {len(all_tools)} tools from {len(self.connections)} connections")
+        logger.debug("Retrieved %d tools from %d connections", len(all_tools), len(self.connections))
         return all_tools, tool_map
     
+    def get_cached(self, provider: str):
+        """Return (mcp_tools, tool_map, provider_tools, version) for the
+        current tool set, built once per tools_version."""
+        def build():
+            mcp_tools, tool_map = self.get_all_tools()
+            if provider == LLMProvider.GROQ:
+                provider_tools = self.get_tools_for_groq(mcp_tools)
+            elif provider == LLMProvider.GEMINI:
+                provider_tools = self.get_tools_for_gemini(mcp_tools)
+            else:
+                provider_tools = mcp_tools
+            return mcp_tools, tool_map, provider_tools, self.tools_version
+        return self.memo(("provider", provider), build)
+
+    def get_gemini_tool_param(self):
+        """The `tools=` value for GenerateContentConfig, built once per version."""
+        def build():
+            _, _, gemini_tools, _ = self.get_cached(LLMProvider.GEMINI)
+            return [types.Tool(function_declarations=gemini_tools)] if gemini_tools else None
+        return self.memo("gemini_tool_param", build)
+
+    def get_tools_fingerprint(self) -> str:
+        """Stable hash of the connected tool set, used in LLM cache keys."""
+        def build():
+            all_tools, _ = self.get_all_tools()
+            return hashlib.blake2b(
+                orjson.dumps(all_tools, option=orjson.OPT_SORT_KEYS), digest_size=16
+            ).hexdigest()
+        return self.memo("fingerprint", build)
+
     def get_tools_for_groq(self, tools):
         """Convert tools to Groq/OpenAI format"""
         return [
@@ -501,25 +787,6 @@ class ConnectionManager:
     
     def get_tools_for_gemini(self, tools):
         """Convert tools to Gemini format"""
-        def clean_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
-            if not isinstance(schema, dict):
-                return schema
-            schema = schema.copy()
-            for key in ['title', '$schema', 'additionalProperties', 'default']:
-                if key in schema:
-                    del schema[key]
-            if 'type' not in schema:
-                if 'properties' in schema:
-                    schema['type'] = 'object'
-                else:
-                    schema['type'] = 'string'
-            if 'properties' in schema:
-                for k, v in schema['properties'].items():
-                    schema['properties'][k] = clean_schema(v)
-            if 'items' in schema:
-                schema['items'] = clean_schema(schema['items'])
-            return schema
-        
         return [
             types.FunctionDeclaration(
                 name=tool["name"],
@@ -529,28 +796,60 @@ class ConnectionManager:
             for tool in tools
         ]
 
-    async def execute_tool(self, unique_name: str, args: dict, tool_map: dict):
+    async def execute_tool(self, unique_name: str, args: dict, tool_map: dict) -> str:
+        """Run a tool and return its output (or an error message) as text."""
+        _, text = await self.execute_tool_checked(unique_name, args, tool_map)
+        return text
+
+    async def execute_tool_checked(self, unique_name: str, args: dict, tool_map: dict):
+        """Run a tool, returning (ok, text). Calls to tools annotated
+        read-only/idempotent share the result with identical calls already
+        in flight."""
+        info = tool_map.get(unique_name)
+        key = None
+        if info and info.get('shareable'):
+            try:
+                key = (info['connection_id'], info['real_name'],
+                       orjson.dumps(args, option=orjson.OPT_SORT_KEYS))
+            except TypeError:
+                pass  # Non-JSON args; just run without dedup
+
+        if key is None:
+            return await self._execute_tool(unique_name, args, tool_map)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._execute_tool(unique_name, args, tool_map))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled waiter doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _execute_tool(self, unique_name: str, args: dict, tool_map: dict):
+        """Run the call; failures come back as (False, error message)."""
         start_time = time.time()
         info = tool_map.get(unique_name)
         
         if not info:
-            logger.error(f"Tool not found: {unique_name}")
-            return f"Error: Tool {unique_name} not found."
+            logger.error("Tool not found: %s", unique_name)
+            return False, f"Error: Tool {unique_name} not found."
         
         conn = self.connections.get(info['connection_id'])
         if not conn:
-            logger.error(f"Connection lost for tool: {unique_name}")
-            return "Error: Connection lost."
+            logger.error("Connection lost for tool: %s", unique_name)
+            return False, "Error: Connection lost."
         
         try:
-            logger.debug(f"Executing tool: {info['real_name']}", extra={
-                "extra_data": {"args": args, "connection": info['connection_id']}
-            })
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Executing tool: %s", info['real_name'], extra={
+                    "extra_data": {"args": args, "connection": info['connection_id']}
+                })
             
-            result: CallToolResult = await conn.session.call_tool(
-                info['real_name'], 
-                arguments=args
-            )
+            async with conn.sem:
+                result: CallToolResult = await conn.session.call_tool(
+                    info['real_name'], 
+                    arguments=args
+                )
             
             duration = time.time() - start_time
             
@@ -565,32 +864,33 @@ class ConnectionManager:
                     success=False,
                     error=error_msg
                 )
-                return error_msg
-            
-            output_parts = []
-            
-            if hasattr(result, "structuredContent") and result.structuredContent:
-                output_parts.append(json.dumps(result.structuredContent, indent=2))
+                return False, error_msg
             
-            if result.content:
-                for content in result.content:
-                    if isinstance(content, TextContent):
-                        output_parts.append(content.text)
-                    elif isinstance(content, ImageContent):
-                        output_parts.append(f"[Image Returned: {content.mimeType}]")
-                    elif isinstance(content, EmbeddedResource):
-                        output_parts.append(f"[Resource Embedded: {content.resource.uri}]")
-                    else:
-                        output_parts.append(str(content))
+            # Write parts into a buffer capped at MAX_TOOL_RESULT_LENGTH so a
+            # huge result is never joined into one full-size string. The
+            # uncapped length is still tracked for the truncation notice.
+            buf = io.StringIO()
+            written = 0
+            original_length = 0
+            for i, piece in enumerate(_iter_tool_output(result)):
+                if i:
+                    piece = "\n" + piece
+                original_length += len(piece)
+                remaining = MAX_TOOL_RESULT_LENGTH - written
+                if remaining <= 0:
+                    continue
+                if len(piece) > remaining:
+                    piece = piece[:remaining]
+                buf.write(piece)
+                written += len(piece)
             
-            final_out = "\n".join(output_parts)
+            final_out = buf.getvalue()
             
             # Truncate if too long
-            if len(final_out) > MAX_TOOL_RESULT_LENGTH:
-                original_length = len(final_out)
-                truncated = final_out[:MAX_TOOL_RESULT_LENGTH]
+            if original_length > MAX_TOOL_RESULT_LENGTH:
+                truncated = final_out
                 
-                logger.warning(f"Tool output truncated", extra={
+                logger.warning("Tool output truncated", extra={
                     "extra_data": {
                         "tool": info['real_name'],
                         "original_length": original_length,
@@ -618,17 +918,12 @@ class ConnectionManager:
                 success=True
             )
             
-            return final_out if final_out else "✅ Success (No output)"
+            return True, final_out if final_out else "✅ Success (No output)"
             
         except Exception as e:
             duration = time.time() - start_time
             error_msg = f"❌ Tool Exception: {str(e)}"
             
-            log_exception("Tool execution failed", e, 
-                tool_name=info['real_name'],
-                args=args
-            )
-            
             log_tool_execution(
                 tool_name=info['real_name'],
                 session_id="N/A",
@@ -636,19 +931,21 @@ class ConnectionManager:
                 result=None,
                 duration=duration,
                 success=False,
-                error=str(e)
+                error=str(e),
+                exc=e
             )
             
-            return error_msg
+            return False, error_msg
 
     async def read_resource(self, connection_id: str, uri: str):
         conn = self.connections.get(connection_id)
         if not conn:
             raise ValueError("Connection not found")
         
-        logger.debug(f"Reading resource: {uri}", extra={
-            "extra_data": {"connection_id": connection_id}
-        })
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Reading resource: %s", uri, extra={
+                "extra_data": {"connection_id": connection_id}
+            })
         
         result = await conn.session.read_resource(uri)
         contents = []
@@ -664,9 +961,10 @@ class ConnectionManager:
         if not conn:
             raise ValueError("Connection not found")
         
-        logger.debug(f"Getting prompt: {name}", extra={
-            "extra_data": {"connection_id": connection_id, "args": args}
-        })
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Getting prompt: %s", name, extra={
+                "extra_data": {"connection_id": connection_id, "args": args}
+            })
         
         result = await conn.session.get_prompt(name, arguments=args)
         prompt_text = []
@@ -681,99 +979,288 @@ manager = ConnectionManager()
 # 2. CORE LOGIC (Multi-Provider Support)
 # ==========================================
 
+# Writes from the streaming paths go through one background writer so they
+# never block the event loop and are applied in the order they were queued.
+# Readers call wait_for_db_writes() first so they always see them.
+_db_write_queue: Optional[asyncio.Queue] = None
+
+async def _db_writer():
+    while True:
+        fn, args = await _db_write_queue.get()
+        try:
+            await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            log_exception("Background DB write failed", e, operation=fn.__name__)
+        finally:
+            _db_write_queue.task_done()
+
+def schedule_db_write(fn, *args):
+    """Queue a DB write; runs inline if the writer hasn't been started."""
+    if _db_write_queue is None:
+        fn(*args)
+        return
+    _db_write_queue.put_nowait((fn, args))
+
+async def wait_for_db_writes():
+    if _db_write_queue is not None:
+        await _db_write_queue.join()
+
+_SSE_DONE = b"data: [DONE]\n\n"
+
+def sse(obj: Any) -> bytes:
+    """Encode one Server-Sent Events data frame."""
+    return b"data: " + orjson.dumps(obj) + b"\n\n"
+
+def _sse_error(message: str) -> bytes:
+    return b'data: {"error":' + orjson.dumps(message) + b'}\n\n'
+
+class SSETextBatcher:
+    """Coalesce streamed text deltas into fewer SSE frames.
+
+    The first delta is sent straight away to keep time-to-first-token low;
+    after that text is buffered until max_tokens deltas or max_ms have
+    accumulated. Callers must flush() before any non-text frame and at the
+    end of the stream.
+    """
+    def __init__(self, max_tokens: int = 8, max_ms: float = 25):
+        self.max_tokens = max_tokens
+        self.max_s = max_ms / 1000
+        self.parts: List[str] = []
+        self.sent_first = False
+        self.last_flush = time.monotonic()
+
+    def add(self, text: str) -> Optional[bytes]:
+        if not self.sent_first:
+            self.sent_first = True
+            self.last_flush = time.monotonic()
+            return sse({'type': 'text', 'content': text})
+        self.parts.append(text)
+        if len(self.parts) >= self.max_tokens or time.monotonic() - self.last_flush >= self.max_s:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        if not self.parts:
+            return None
+        text = "".join(self.parts)
+        self.parts.clear()
+        self.last_flush = time.monotonic()
+        return sse({'type': 'text', 'content': text})
+
+def _groq_system_prompt(groq_tools: List[Dict]) -> str:
+    shown = groq_tools[:10]
+    def render():
+        tool_names = "\n".join([f"- {t['function']['name']}: {t['function']['description']}" for t in shown])
+        return f"""You are a helpful AI assistant with access to tools.
+
+Available Tools:
+{tool_names}
+
+IMPORTANT INSTRUCTIONS:
+- When users ask "what tools do you have" or "list your tools", simply DESCRIBE the available tools in natural language. DO NOT execute them.
+- Only use tools when the user specifically asks you to perform an action (e.g., "fetch the documentation", "get the data").
+- If a tool returns a lot of data, summarize it concisely.
+- Always explain what you're doing before using a tool."""
+    return manager.memo(("system_prompt", "groq"), render)
+
+def _gemini_system_instruction(gemini_tools: List[Any]) -> str:
+    shown = gemini_tools[:10]
+    def render():
+        tool_names = ", ".join([t.name for t in shown])
+        return f"""You are a helpful AI assistant with access to tools.
+
+Available Tools: {tool_names}
+
+IMPORTANT INSTRUCTIONS:
+- When users ask "what tools do you have" or "list your tools", simply DESCRIBE the available tools. DO NOT execute them.
+- Only use tools when the user specifically asks you to perform an action.
+- If a tool returns a lot of data, summarize it concisely.
+- Always explain what you're doing before using a tool.
+"""
+    return manager.memo(("system_prompt", "gemini"), render)
+
+def _gemini_config(gemini_tools: List[Any]) -> "types.GenerateContentConfig":
+    """GenerateContentConfig for the current tool set.
+
+    Everything in it (tools, system instruction) only changes with the tool
+    set, so the validated model object is built once per tools_version.
+    """
+    def build():
+        system_instruction = "You are a helpful AI assistant."
+        if gemini_tools:
+            system_instruction = _gemini_system_instruction(gemini_tools)
+
+        return types.GenerateContentConfig(
+            tools=manager.get_gemini_tool_param(),
+            temperature=1.0,
+            system_instruction=system_instruction,
+        )
+    return manager.memo("gemini_config", build)
+
+def _to_groq_messages(msg: Dict) -> List[Dict]:
+    """Convert one stored message to Groq/OpenAI chat messages."""
+    role = msg['role']
+
+    # Handle tool results (already truncated when persisted)
+    if msg.get('is_tool_result'):
+        return [{
+            "role": "tool",
+            "tool_call_id": msg.get('tool_call_id', 'unknown'),
+            "content": msg['content']
+        }]
+
+    # Handle assistant messages with tool calls
+    if role == "model" or role == "assistant":
+        message = {"role": "assistant"}
+
+        if msg.get('content'):
+            message["content"] = msg['content']
+
+        if msg.get('toolCalls'):
+            message["tool_calls"] = [
+                {
+                    "id": tc['id'],
+                    "type": "function",
+                    "function": {
+                        "name": tc['name'],
+                        # Ensure arguments is NEVER None. It must be a JSON string.
+                        # args_json is precomputed at persist time; legacy rows fall back.
+                        "arguments": tc.get('args_json') or (json.dumps(tc['args']) if isinstance(tc['args'], dict) else (tc['args'] or "{}"))
+                    }
+                }
+                for tc in msg['toolCalls']
+            ]
+
+        return [message]
+
+    # Handle user messages
+    if role == "user":
+        return [{
+            "role": "user",
+            "content": msg['content']
+        }]
+
+    return []
+
+def _to_gemini_contents(msg: Dict) -> List[Any]:
+    """Convert one stored message to Gemini Content objects."""
+    role = "model" if msg['role'] == "model" else "user"
+    parts = []
+
+    if msg.get('toolCalls'):
+        for tc in msg['toolCalls']:
+            function_call_part = types.Part.from_function_call(
+                name=tc['name'],
+                args=tc['args']
+            )
+            parts.append(function_call_part)
+
+    elif msg.get('is_tool_result'):
+        tool_name = msg.get('tool_name')
+        if not tool_name:
+            # Legacy rows stored before tool_name was persisted
+            tool_name = "unknown_tool"
+            match = _TOOL_OUT_RE.search(msg.get('content', ''))
+            if match:
+                tool_name = match.group(1)
+
+        parts.append(types.Part.from_function_response(
+            name=tool_name,
+            response={"result": msg['content']}
+        ))
+
+    elif msg.get('content'):
+        parts.append(types.Part.from_text(text=msg['content']))
+
+    if parts:
+        return [types.Content(role=role, parts=parts)]
+    return []
+
+# Converted history per session. A request reuses the conversion of the
+# unchanged message prefix from the previous request and only converts
+# the new tail; a changed id/content at position k re-converts from k.
+_HISTORY_CACHE_SIZE = 256
+_groq_hist_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_gemini_hist_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+def _history_signature(msg: Dict) -> tuple:
+    return (msg.get('id'), msg.get('content'), len(msg.get('toolCalls') or ()))
+
+def _convert_history(cache: OrderedDict, session_id: str, raw_history: List[Dict], convert) -> List[Any]:
+    sigs = [_history_signature(m) for m in raw_history]
+    per_msg = []
+    cached = cache.get(session_id)
+    if cached is not None:
+        old_sigs, old_per_msg = cached
+        limit = min(len(old_sigs), len(sigs))
+        k = 0
+        while k < limit and old_sigs[k] == sigs[k]:
+            k += 1
+        per_msg = old_per_msg[:k]
+    for msg in raw_history[len(per_msg):]:
+        per_msg.append(convert(msg))
+
+    cache[session_id] = (sigs, per_msg)
+    cache.move_to_end(session_id)
+    while len(cache) > _HISTORY_CACHE_SIZE:
+        cache.popitem(last=False)
+    return [item for items in per_msg for item in items]
+
+def forget_session_history(session_id: str):
+    _groq_hist_cache.pop(session_id, None)
+    _gemini_hist_cache.pop(session_id, None)
+
+def _groq_tool_data(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a buffered streamed tool call into the stored/emitted shape."""
+    args = entry.get("args")
+    if args is None:
+        try:
+            args = json.loads(entry["arguments"])
+        except ValueError:
+            args = {}
+    return {"id": entry["id"], "name": entry["name"], "args": args}
+
 async def stream_groq_response(session_id: str, raw_history: List[Dict]):
     start_time = time.time()
     
-    if not groq_async_client:
+    groq_async = get_groq_async()
+    if not groq_async:
         logger.error("Groq client not initialized")
-        yield f"data: {json.dumps({'error': 'Groq client not initialized'})}\n\n"
+        yield _sse_error('Groq client not initialized')
         return
     
-    mcp_tools, tool_map = manager.get_all_tools()
-    groq_tools = manager.get_tools_for_groq(mcp_tools)
+    _, _, groq_tools, _ = manager.get_cached(LLMProvider.GROQ)
 
     # Convert history to Groq format
     groq_messages = []
     
     # Add system message with clear instructions
     if groq_tools:
-        tool_names = "\n".join([f"- {t['function']['name']}: {t['function']['description']}" for t in groq_tools[:10]])
-        system_msg = {
+        groq_messages.append({
             "role": "system",
-            "content": f"""You are a helpful AI assistant with access to tools.
-
-Available Tools:
-{tool_names}
-
-IMPORTANT INSTRUCTIONS:
-- When users ask "what tools do you have" or "list your tools", simply DESCRIBE the available tools in natural language. DO NOT execute them.
-- Only use tools when the user specifically asks you to perform an action (e.g., "fetch the documentation", "get the data").
-- If a tool returns a lot of data, summarize it concisely.
-- Always explain what you're doing before using a tool."""
-        }
-        groq_messages.append(system_msg)
+            "content": _groq_system_prompt(groq_tools)
+        })
     
-    for msg in raw_history:
-        role = msg['role']
-        
-        # Handle tool results - TRUNCATE LONG OUTPUTS
-        if msg.get('is_tool_result'):
-            content = msg['content']
-            max_tool_result_length = 8000
-            if len(content) > max_tool_result_length:
-                content = content[:max_tool_result_length] + f"\n\n[... Output truncated. Total length: {len(msg['content'])} characters]"
-            
-            groq_messages.append({
-                "role": "tool",
-                "tool_call_id": msg.get('tool_call_id', 'unknown'),
-                "content": content
-            })
-            continue
-        
-        # Handle assistant messages with tool calls
-        if role == "model" or role == "assistant":
-            message = {"role": "assistant"}
-            
-            if msg.get('content'):
-                message["content"] = msg['content']
-            
-            if msg.get('toolCalls'):
-                message["tool_calls"] = [
-                    {
-                        "id": tc['id'],
-                        "type": "function",
-                        "function": {
-                            "name": tc['name'],
-                            # Ensure arguments is NEVER None. It must be a JSON string.
-                            "arguments": json.dumps(tc['args']) if isinstance(tc['args'], dict) else (tc['args'] or "{}")
-                        }
-                    }
-                    for tc in msg['toolCalls']
-                ]
-            
-            groq_messages.append(message)
-        
-        # Handle user messages
-        elif role == "user":
-            groq_messages.append({
-                "role": "user",
-                "content": msg['content']
-            })
+    groq_messages.extend(
+        _convert_history(_groq_hist_cache, session_id, raw_history, _to_groq_messages)
+    )
 
     if not groq_messages:
         return
 
+    batcher = SSETextBatcher()
     try:
-        logger.debug(f"Sending request to Groq", extra={
-            "extra_data": {
-                "session_id": session_id,
-                "message_count": len(groq_messages),
-                "has_tools": len(groq_tools) > 0
-            }
-        })
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Sending request to Groq", extra={
+                "extra_data": {
+                    "session_id": session_id,
+                    "message_count": len(groq_messages),
+                    "has_tools": len(groq_tools) > 0
+                }
+            })
         
         # Make streaming request to Groq
-        stream = await groq_async_client.chat.completions.create(
+        stream = await groq_async.chat.completions.create(
             model=GROQ_MODEL,
             messages=groq_messages,
             tools=groq_tools if groq_tools else None,
@@ -786,21 +1273,28 @@ IMPORTANT INSTRUCTIONS:
 
         final_text = ""
         tool_calls_buffer = {}
+        approval_sent = False
+        # Without tools the model cannot emit tool calls; skip that path per chunk
+        tools_enabled = bool(groq_tools)
         
         async for chunk in stream:
-            if not chunk.choices:
+            choices = chunk.choices
+            if not choices:
                 continue
             
-            delta = chunk.choices[0].delta
+            delta = choices[0].delta
+            content = delta.content
             
             # Handle text content
-            if delta.content:
-                final_text += delta.content
-                yield f"data: {json.dumps({'type': 'text', 'content': delta.content})}\n\n"
+            if content:
+                final_text += content
+                frame = batcher.add(content)
+                if frame:
+                    yield frame
             
             # Handle tool calls
-            if delta.tool_calls:
-                for tool_call in delta.tool_calls:
+            if tools_enabled and (tc_list := delta.tool_calls):
+                for tool_call in tc_list:
                     idx = tool_call.index
                     
                     if idx not in tool_calls_buffer:
@@ -818,36 +1312,55 @@ IMPORTANT INSTRUCTIONS:
                             tool_calls_buffer[idx]["name"] = tool_call.function.name
                         if tool_call.function.arguments:
                             tool_calls_buffer[idx]["arguments"] += tool_call.function.arguments
+                    
+                    # Send the approval as soon as the call's arguments form
+                    # valid JSON instead of waiting for the stream to end
+                    entry = tool_calls_buffer[idx]
+                    if not approval_sent and entry["id"] and entry["name"] and entry["arguments"]:
+                        try:
+                            entry["args"] = json.loads(entry["arguments"])
+                        except ValueError:
+                            continue
+                        frame = batcher.flush()
+                        if frame:
+                            yield frame
+                        tool_data = {"id": entry["id"], "name": entry["name"], "args": entry["args"]}
+                        # Queue the assistant row before the client can see the
+                        # approval: an approved tool result must never be stored
+                        # ahead of the tool call it answers
+                        schedule_db_write(db.add_message, session_id, {
+                            "id": str(uuid.uuid4()),
+                            "role": "assistant",
+                            "content": final_text,
+                            "toolCalls": [tool_data]
+                        })
+                        yield sse({'type': 'tool_approval_request', 'tool': tool_data})
+                        approval_sent = True
+        
+        frame = batcher.flush()
+        if frame:
+            yield frame
         
         # Process completed tool calls
-        if tool_calls_buffer:
-            tool_calls_list = []
-            for tool_call_data in tool_calls_buffer.values():
-                try:
-                    args = json.loads(tool_call_data["arguments"])
-                except:
-                    args = {}
-                
-                tool_data = {
-                    "id": tool_call_data["id"],
-                    "name": tool_call_data["name"],
-                    "args": args
-                }
-                tool_calls_list.append(tool_data)
-            
-            # Save assistant message with tool calls
-            db.add_message(session_id, {
-                "id": str(uuid.uuid4()),
-                "role": "assistant",
-                "content": final_text,
-                "toolCalls": tool_calls_list
-            })
+        if tools_enabled and tool_calls_buffer:
+            if len(tool_calls_buffer) == 1:
+                # parallel_tool_calls=False, so this is the normal case
+                tool_calls_list = [_groq_tool_data(next(iter(tool_calls_buffer.values())))]
+            else:
+                tool_calls_list = [_groq_tool_data(d) for d in tool_calls_buffer.values()]
             
-            # Send tool approval request for first tool
-            if tool_calls_list:
-                yield f"data: {json.dumps({'type': 'tool_approval_request', 'tool': tool_calls_list[0]})}\n\n"
+            # Arguments never parsed mid-stream: save the assistant message,
+            # then send the approval request for the first tool
+            if not approval_sent:
+                schedule_db_write(db.add_message, session_id, {
+                    "id": str(uuid.uuid4()),
+                    "role": "assistant",
+                    "content": final_text,
+                    "toolCalls": tool_calls_list
+                })
+                yield sse({'type': 'tool_approval_request', 'tool': tool_calls_list[0]})
             
-            yield "data: [DONE]\n\n"
+            yield _SSE_DONE
             
             duration = time.time() - start_time
             log_llm_request(
@@ -860,151 +1373,114 @@ IMPORTANT INSTRUCTIONS:
             )
             return
         
-        # Save final message if no tool calls
+        # Save final message if no tool calls. This only enqueues, so it
+        # stays ahead of [DONE] and a follow-up request will see the row
         if final_text:
-            db.add_message(session_id, {
+            schedule_db_write(db.add_message, session_id, {
                 "id": str(uuid.uuid4()),
                 "role": "assistant",
                 "content": final_text
             })
         
         duration = time.time() - start_time
-        log_llm_request(
-            provider="groq",
-            model=GROQ_MODEL,
-            session_id=session_id,
-            message_count=len(groq_messages),
-            duration=duration,
-            success=True
-        )
-        
-        yield "data: [DONE]\n\n"
+        try:
+            yield _SSE_DONE
+        finally:
+            log_llm_request(
+                provider="groq",
+                model=GROQ_MODEL,
+                session_id=session_id,
+                message_count=len(groq_messages),
+                duration=duration,
+                success=True
+            )
 
     except Exception as e:
         duration = time.time() - start_time
-        log_llm_request(
-            provider="groq",
-            model=GROQ_MODEL,
-            session_id=session_id,
-            message_count=len(groq_messages),
-            duration=duration,
-            success=False,
-            error=str(e)
-        )
-        log_exception("Groq API error", e, session_id=session_id)
-        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        # Get the error to the client first; logging runs even if the
+        # client has already gone away
+        try:
+            frame = batcher.flush()
+            if frame:
+                yield frame
+            yield _sse_error(str(e))
+        finally:
+            log_llm_request(
+                provider="groq",
+                model=GROQ_MODEL,
+                session_id=session_id,
+                message_count=len(groq_messages),
+                duration=duration,
+                success=False,
+                error=str(e)
+            )
+            log_exception("Groq API error", e, session_id=session_id)
 
 async def stream_gemini_response(session_id: str, raw_history: List[Dict]):
     start_time = time.time()
     
-    if not gemini_client:
+    gemini = get_gemini()
+    if not gemini:
         logger.error("Gemini client not initialized")
-        yield f"data: {json.dumps({'error': 'Gemini client not initialized'})}\n\n"
+        yield _sse_error('Gemini client not initialized')
         return
     
-    mcp_tools, tool_map = manager.get_all_tools()
-    gemini_tools = manager.get_tools_for_gemini(mcp_tools)
-
-    system_instruction = "You are a helpful AI assistant."
-    if gemini_tools:
-        tool_names = ", ".join([t.name for t in gemini_tools[:10]])
-        system_instruction = f"""You are a helpful AI assistant with access to tools.
-
-Available Tools: {tool_names}
-
-IMPORTANT INSTRUCTIONS:
-- When users ask "what tools do you have" or "list your tools", simply DESCRIBE the available tools. DO NOT execute them.
-- Only use tools when the user specifically asks you to perform an action.
-- If a tool returns a lot of data, summarize it concisely.
-- Always explain what you're doing before using a tool.
-"""
+    _, _, gemini_tools, _ = manager.get_cached(LLMProvider.GEMINI)
+    config = _gemini_config(gemini_tools)
 
-    config = types.GenerateContentConfig(
-        tools=[types.Tool(function_declarations=gemini_tools)] if gemini_tools else None,
-        temperature=1.0,
-        system_instruction=system_instruction,
-    )
-
-    gemini_history = []
-   
-    for msg in raw_history:
-        role = "model" if msg['role'] == "model" else "user"
-        parts = []
-       
-        if msg.get('toolCalls'):
-            for tc in msg['toolCalls']:
-                function_call_part = types.Part.from_function_call(
-                    name=tc['name'],
-                    args=tc['args']
-                )
-                parts.append(function_call_part)
-       
-        elif msg.get('is_tool_result'):
-            tool_name = "unknown_tool"
-            match = re.search(r"Tool '([^']+)' Output:", msg.get('content', ''))
-            if match:
-                tool_name = match.group(1)
-            
-            # Truncate long tool results
-            content = msg['content']
-            max_length = 8000
-            if len(content) > max_length:
-                content = content[:max_length] + f"\n\n[... Output truncated. Total: {len(msg['content'])} chars]"
-           
-            parts.append(types.Part.from_function_response(
-                name=tool_name,
-                response={"result": content}
-            ))
-
-        elif msg.get('content'):
-            parts.append(types.Part.from_text(text=msg['content']))
-           
-        if parts:
-            gemini_history.append(types.Content(role=role, parts=parts))
+    gemini_history = _convert_history(_gemini_hist_cache, session_id, raw_history, _to_gemini_contents)
 
     if not gemini_history:
         return
 
+    batcher = SSETextBatcher()
     try:
-        logger.debug(f"Sending request to Gemini", extra={
-            "extra_data": {
-                "session_id": session_id,
-                "message_count": len(gemini_history),
-                "has_tools": len(gemini_tools) > 0
-            }
-        })
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Sending request to Gemini", extra={
+                "extra_data": {
+                    "session_id": session_id,
+                    "message_count": len(gemini_history),
+                    "has_tools": len(gemini_tools) > 0
+                }
+            })
         
-        response_stream = await gemini_client.aio.models.generate_content_stream(
+        response_stream = await gemini.aio.models.generate_content_stream(
             model=GEMINI_MODEL, contents=gemini_history, config=config
         )
 
         final_text = ""
        
         async for chunk in response_stream:
-            if not chunk.candidates:
+            cands = chunk.candidates
+            if not cands:
+                continue
+            content = cands[0].content
+            if not content or not content.parts:
                 continue
            
-            cand = chunk.candidates[0]
-           
-            for part in cand.content.parts:
-                if part.function_call:
+            for part in content.parts:
+                function_call = part.function_call
+                if function_call:
                     call_id = str(uuid.uuid4())
                     tool_data = {
                         "id": call_id,
-                        "name": part.function_call.name,
-                        "args": dict(part.function_call.args)
+                        "name": function_call.name,
+                        "args": dict(function_call.args)
                     }
                    
-                    yield f"data: {json.dumps({'type': 'tool_approval_request', 'tool': tool_data})}\n\n"
-                   
-                    db.add_message(session_id, {
+                    frame = batcher.flush()
+                    if frame:
+                        yield frame
+                    # Queued before the approval goes out (see stream_groq_response)
+                    schedule_db_write(db.add_message, session_id, {
                         "id": str(uuid.uuid4()),
                         "role": "model",
                         "content": final_text,
                         "toolCalls": [tool_data]
                     })
+                    yield sse({'type': 'tool_approval_request', 'tool': tool_data})
                    
-                    yield "data: [DONE]\n\n"
+                    yield _SSE_DONE
                     
                     duration = time.time() - start_time
                     log_llm_request(
@@ -1017,42 +1493,152 @@ IMPORTANT INSTRUCTIONS:
                     )
                     return
 
-                if part.text:
-                    final_text += part.text
-                    yield f"data: {json.dumps({'type': 'text', 'content': part.text})}\n\n"
+                text = part.text
+                if text:
+                    final_text += text
+                    frame = batcher.add(text)
+                    if frame:
+                        yield frame
+
+        frame = batcher.flush()
+        if frame:
+            yield frame
 
+        # Enqueue only (see stream_groq_response), then finish the stream
         if final_text:
-            db.add_message(session_id, {
+            schedule_db_write(db.add_message, session_id, {
                 "id": str(uuid.uuid4()),
                 "role": "model",
                 "content": final_text
             })
         
         duration = time.time() - start_time
-        log_llm_request(
-            provider="gemini",
-            model=GEMINI_MODEL,
-            session_id=session_id,
-            message_count=len(gemini_history),
-            duration=duration,
-            success=True
-        )
-       
-        yield "data: [DONE]\n\n"
+        try:
+            yield _SSE_DONE
+        finally:
+            log_llm_request(
+                provider="gemini",
+                model=GEMINI_MODEL,
+                session_id=session_id,
+                message_count=len(gemini_history),
+                duration=duration,
+                success=True
+            )
 
     except Exception as e:
         duration = time.time() - start_time
-        log_llm_request(
-            provider="gemini",
-            model=GEMINI_MODEL,
-            session_id=session_id,
-            message_count=len(gemini_history),
-            duration=duration,
-            success=False,
-            error=str(e)
-        )
-        log_exception("Gemini API error", e, session_id=session_id)
-        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        # Get the error to the client first; logging runs even if the
+        # client has already gone away
+        try:
+            frame = batcher.flush()
+            if frame:
+                yield frame
+            yield _sse_error(str(e))
+        finally:
+            log_llm_request(
+                provider="gemini",
+                model=GEMINI_MODEL,
+                session_id=session_id,
+                message_count=len(gemini_history),
+                duration=duration,
+                success=False,
+                error=str(e)
+            )
+            log_exception("Gemini API error", e, session_id=session_id)
+
+def _is_cacheable(frames: List[bytes]) -> bool:
+    """Only cache turns that streamed to completion without an error frame."""
+    return (
+        bool(frames)
+        and frames[-1] == _SSE_DONE
+        and not any(f.startswith(b'data: {"error"') for f in frames)
+    )
+
+async def _replay_cached_response(session_id: str, provider: str, frames: List[bytes]):
+    """Stream cached frames and persist the assistant turn they describe."""
+    final_text = ""
+    tool_calls = []
+    out_frames = []
+    for frame in frames:
+        if frame != _SSE_DONE:
+            payload = orjson.loads(frame[len(b"data: "):])
+            if payload.get("type") == "text":
+                final_text += payload["content"]
+            elif payload.get("type") == "tool_approval_request":
+                # Fresh id so the replayed call doesn't collide with the original
+                tool = {**payload["tool"], "id": str(uuid.uuid4())}
+                tool_calls.append(tool)
+                frame = sse({'type': 'tool_approval_request', 'tool': tool})
+        out_frames.append(frame)
+
+    # Persist before replaying so an approval can't race ahead of its row
+    message = {
+        "id": str(uuid.uuid4()),
+        "role": "assistant" if provider == LLMProvider.GROQ else "model",
+        "content": final_text
+    }
+    if tool_calls:
+        message["toolCalls"] = tool_calls
+    if final_text or tool_calls:
+        schedule_db_write(db.add_message, session_id, message)
+
+    for frame in out_frames:
+        yield frame
+
+    logger.info("LLM response served from cache", extra={
+        "extra_data": {"session_id": session_id, "provider": provider}
+    })
+
+# "What tools do you have?"-style questions are answered locally from the
+# connected tool list instead of a full LLM round-trip. Anchored to the whole
+# message so requests that merely mention tools still reach the LLM.
+LIST_TOOLS_RE = re.compile(
+    r"^\s*(what|which)\s+tools\s+(do|can)\s+you\s+(have|use)\s*\??\s*$"
+    r"|^\s*list\s+(your|the|all)\s+tools\s*\.?\s*$",
+    re.I
+)
+_LIST_TOOLS_MAX_LEN = 80
+
+def _is_list_tools_question(raw_history: List[Dict]) -> bool:
+    if not raw_history:
+        return False
+    last = raw_history[-1]
+    content = last.get('content') or ""
+    if (last.get('role') != "user" or last.get('is_tool_result')
+            or len(content) > _LIST_TOOLS_MAX_LEN or not LIST_TOOLS_RE.match(content)):
+        return False
+    # Mid tool-use conversation; let the model answer in context
+    if len(raw_history) >= 2:
+        prev = raw_history[-2]
+        if prev.get('role') in ("assistant", "model") and prev.get('toolCalls'):
+            return False
+    return True
+
+def _render_tools_reply() -> str:
+    def build():
+        mcp_tools, _ = manager.get_all_tools()
+        if not mcp_tools:
+            return "I don't have any tools available right now. Connect an MCP server to give me some."
+        lines = [f"I have access to {len(mcp_tools)} tool{'s' if len(mcp_tools) != 1 else ''}:\n"]
+        for tool in mcp_tools:
+            description = tool["description"].strip().split("\n", 1)[0][:200]
+            lines.append(f"- **{tool['name']}**: {description}")
+        lines.append("\nAsk me to perform an action and I'll use the right tool.")
+        return "\n".join(lines)
+    return manager.memo("tools_reply", build)
+
+async def _answer_list_tools(session_id: str, provider: str):
+    reply = _render_tools_reply()
+    yield sse({'type': 'text', 'content': reply})
+    schedule_db_write(db.add_message, session_id, {
+        "id": str(uuid.uuid4()),
+        "role": "assistant" if provider == LLMProvider.GROQ else "model",
+        "content": reply
+    })
+    yield _SSE_DONE
+    logger.info("Answered tool listing locally", extra={
+        "extra_data": {"session_id": session_id, "provider": provider}
+    })
 
 async def stream_llm_response(session_id: str, raw_history: List[Dict], provider: str = None):
     """Route to appropriate LLM provider"""
@@ -1060,27 +1646,65 @@ async def stream_llm_response(session_id: str, raw_history: List[Dict], provider
         provider = ACTIVE_PROVIDER
     
     if provider == LLMProvider.GROQ:
-        async for chunk in stream_groq_response(session_id, raw_history):
-            yield chunk
+        model, streamer = GROQ_MODEL, stream_groq_response
     elif provider == LLMProvider.GEMINI:
-        async for chunk in stream_gemini_response(session_id, raw_history):
-            yield chunk
+        model, streamer = GEMINI_MODEL, stream_gemini_response
     else:
         logger.error("No LLM provider available")
-        yield f"data: {json.dumps({'error': 'No LLM provider available'})}\n\n"
+        yield _sse_error('No LLM provider available')
+        return
+
+    if _is_list_tools_question(raw_history):
+        async for chunk in _answer_list_tools(session_id, provider):
+            yield chunk
+        return
+
+    if not llm_cache.enabled():
+        async for chunk in streamer(session_id, raw_history):
+            yield chunk
+        return
+
+    cache_key = llm_cache.CacheKey(f"{provider}/{model}", manager.get_tools_fingerprint(), raw_history)
+    cached = await llm_cache.lookup(cache_key)
+    if cached is not None:
+        async for chunk in _replay_cached_response(session_id, provider, cached):
+            yield chunk
+        return
+
+    frames = []
+    async for chunk in streamer(session_id, raw_history):
+        frames.append(chunk)
+        yield chunk
+
+    if _is_cacheable(frames):
+        llm_cache.store(cache_key, frames)
 
 # ==========================================
 # 3. ENDPOINTS
 # ==========================================
 
+def _tool_result_message_content(tool_name: str, result_text: str):
+    """Build the persisted tool-result content, truncated once at write time
+    so history rebuilds can use it as-is. Returns (content, original_len)."""
+    content = f"Tool '{tool_name}' Output:\n{result_text}"
+    original_len = len(content)
+    if original_len > MAX_TOOL_RESULT_LENGTH:
+        content = content[:MAX_TOOL_RESULT_LENGTH] + f"\n\n[... Output truncated. Total length: {original_len} characters]"
+    return content, original_len
+
+# Bounds concurrent title generations; tasks are kept referenced until done
+_TITLE_SEM = asyncio.Semaphore(4)
+_background_tasks: set = set()
+
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest, bg_tasks: BackgroundTasks):
+async def chat_endpoint(request: ChatRequest):
     start_time = time.time()
     
     if not ACTIVE_PROVIDER:
         logger.error("No LLM provider initialized")
         raise HTTPException(500, "No LLM provider initialized. Please set GROQ_API_KEY or GOOGLE_API_KEY/GOOGLE_CLOUD_PROJECT.")
    
+    await wait_for_db_writes()
     db.add_message(request.session_id, request.new_message)
    
     raw_history = db.get_messages(request.session_id)
@@ -1092,38 +1716,49 @@ async def chat_endpoint(request: ChatRequest, bg_tasks: BackgroundTasks):
     if len(raw_history) <= 1:
         async def gen_title():
             try:
-                if ACTIVE_PROVIDER == LLMProvider.GROQ and groq_client:
-                    response = groq_client.chat.completions.create(
-                        model=GROQ_MODEL,
-                        messages=[
-                            {"role": "user", "content": f"Generate a short 3-5 word title for this message: {request.new_message.get('content')}"}
-                        ],
-                        max_tokens=20,
-                        temperature=0.7
-                    )
-                    if response.choices[0].message.content:
-                        title = response.choices[0].message.content.strip()[:50]
-                        db.update_session_title(request.session_id, title)
+                async with _TITLE_SEM:
+                    await _gen_title()
+            except Exception as e:
+                log_exception("Title generation failed", e, session_id=request.session_id)
+
+        async def _gen_title():
+            groq_async = get_groq_async()
+            gemini = get_gemini()
+            if ACTIVE_PROVIDER == LLMProvider.GROQ and groq_async:
+                response = await groq_async.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=[
+                        {"role": "user", "content": f"Generate a short 3-5 word title for this message: {request.new_message.get('content')}"}
+                    ],
+                    max_tokens=20,
+                    temperature=0.7
+                )
+                if response.choices[0].message.content:
+                    title = response.choices[0].message.content.strip()[:50]
+                    schedule_db_write(db.update_session_title, request.session_id, title)
+                    if logger.isEnabledFor(logging.DEBUG):
                         logger.debug(f"Generated session title: {title}", extra={
                             "extra_data": {"session_id": request.session_id}
                         })
-                
-                elif ACTIVE_PROVIDER == LLMProvider.GEMINI and gemini_client:
-                    res = await gemini_client.aio.models.generate_content(
-                        model=GEMINI_MODEL,
-                        contents=f"Generate a short 3-5 word title: {request.new_message.get('content')}",
-                        config=types.GenerateContentConfig(max_output_tokens=20)
-                    )
-                    if res.text:
-                        title = res.text.strip()[:50]
-                        db.update_session_title(request.session_id, title)
+            
+            elif ACTIVE_PROVIDER == LLMProvider.GEMINI and gemini:
+                res = await gemini.aio.models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=f"Generate a short 3-5 word title: {request.new_message.get('content')}",
+                    config=types.GenerateContentConfig(max_output_tokens=20)
+                )
+                if res.text:
+                    title = res.text.strip()[:50]
+                    schedule_db_write(db.update_session_title, request.session_id, title)
+                    if logger.isEnabledFor(logging.DEBUG):
                         logger.debug(f"Generated session title: {title}", extra={
                             "extra_data": {"session_id": request.session_id}
                         })
-            except Exception as e:
-                log_exception("Title generation failed", e, session_id=request.session_id)
-        
-        bg_tasks.add_task(gen_title)
+    
+        # Run alongside the main stream rather than after it completes
+        task = asyncio.create_task(gen_title())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
     
     duration = time.time() - start_time
     log_api_request(
@@ -1151,16 +1786,20 @@ async def execute_tool_endpoint(req: ExecuteToolRequest):
     _, tool_map = manager.get_all_tools()
     result_text = await manager.execute_tool(req.tool_name, req.tool_args, tool_map)
    
+    content, original_len = _tool_result_message_content(req.tool_name, result_text)
+    await wait_for_db_writes()
     db.add_message(req.session_id, {
         "id": str(uuid.uuid4()),
         "role": "user",
-        "content": f"Tool '{req.tool_name}' Output:\n{result_text}",
+        "content": content,
+        "original_len": original_len,
         "is_tool_result": True,
-        "tool_call_id": req.tool_call_id
+        "tool_call_id": req.tool_call_id,
+        "tool_name": req.tool_name
     })
  
     async def generator():
-        yield f"data: {json.dumps({'type': 'tool_result', 'tool': req.tool_name, 'result': result_text})}\n\n"
+        yield sse({'type': 'tool_result', 'tool': req.tool_name, 'result': result_text})
         raw_history = db.get_messages(req.session_id)
         async for chunk in stream_llm_response(req.session_id, raw_history):
             yield chunk
@@ -1176,6 +1815,77 @@ async def execute_tool_endpoint(req: ExecuteToolRequest):
  
     return StreamingResponse(generator(), media_type="text/event-stream")
 
+@app.post("/api/tools/batch_execute")
+async def batch_execute_tools_endpoint(req: BatchExecuteToolRequest):
+    """Run independent tool calls concurrently; results keep request order."""
+    start_time = time.time()
+    
+    logger.info(f"Batch tool execution requested", extra={
+        "extra_data": {
+            "session_id": req.session_id,
+            "call_count": len(req.calls),
+            "max_concurrent": req.max_concurrent
+        }
+    })
+    
+    _, tool_map = manager.get_all_tools()
+    sem = asyncio.Semaphore(max(1, req.max_concurrent))
+    
+    async def run(call: ExecuteToolRequest):
+        async with sem:
+            return await manager.execute_tool_checked(call.tool_name, call.tool_args, tool_map)
+    
+    tasks = [asyncio.create_task(run(c)) for c in req.calls]
+    if req.stop_on_error:
+        # Cancel whatever hasn't finished once any call fails. Shared
+        # (deduplicated) calls are shielded, so only this batch's wait stops.
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                ok, _ = await next_done
+            except Exception:
+                ok = False
+            if not ok:
+                for task in tasks:
+                    task.cancel()
+                break
+    await asyncio.gather(*tasks, return_exceptions=True)
+    
+    await wait_for_db_writes()
+    response = []
+    for call, task in zip(req.calls, tasks):
+        if task.cancelled():
+            result_text = "⏹️ Skipped: an earlier call in this batch failed (stop_on_error)"
+        elif task.exception() is not None:
+            result_text = f"❌ Tool Exception: {str(task.exception())}"
+        else:
+            _, result_text = task.result()
+        content, original_len = _tool_result_message_content(call.tool_name, result_text)
+        db.add_message(req.session_id, {
+            "id": str(uuid.uuid4()),
+            "role": "user",
+            "content": content,
+            "original_len": original_len,
+            "is_tool_result": True,
+            "tool_call_id": call.tool_call_id,
+            "tool_name": call.tool_name
+        })
+        response.append({
+            "tool_call_id": call.tool_call_id,
+            "tool": call.tool_name,
+            "result": result_text
+        })
+    
+    duration = time.time() - start_time
+    log_api_request(
+        endpoint="/api/tools/batch_execute",
+        method="POST",
+        status_code=200,
+        duration=duration,
+        session_id=req.session_id
+    )
+    
+    return {"results": response}
+
 # --- STANDARD ENDPOINTS ---
 @app.get("/api/llm/status")
 async def get_llm_status():
@@ -1193,9 +1903,15 @@ async def get_llm_status():
             }
         }
     }
-    logger.debug("LLM status requested", extra={"extra_data": status})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("LLM status requested", extra={"extra_data": status})
     return status
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """LLM response cache hit/miss counters"""
+    return {"llm_cache": llm_cache.metrics()}
+
 @app.post("/api/llm/switch")
 async def switch_provider(provider: str):
     """Switch active LLM provider"""
@@ -1252,32 +1968,34 @@ async def get_mcp_status():
             for k, v in manager.connections.items()
         ]
     }
-    logger.debug("MCP status requested", extra={"extra_data": status})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("MCP status requested", extra={"extra_data": status})
     return status
 
-@app.post("/api/mcp/connect")
-async def connect_mcp(req: ConnectRequest):
-    start_time = time.time()
-    
-    # Validate and auto-correct connection type
-    original_type = req.type
-    target = req.target
-    
-    # Auto-detect correct type based on target
+def _corrected_connect_type(target: str, type: str) -> str:
+    """Auto-correct the requested transport for targets that only support one."""
     if target.endswith('.py') or (not target.startswith('http://') and not target.startswith('https://')):
         # Local script - must be stdio
-        if req.type != 'stdio':
-            logger.warning(f"Auto-correcting connection type from '{req.type}' to 'stdio' for local script", extra={
-                "extra_data": {"target": target, "original_type": req.type}
+        if type != 'stdio':
+            logger.warning(f"Auto-correcting connection type from '{type}' to 'stdio' for local script", extra={
+                "extra_data": {"target": target, "original_type": type}
             })
-            req.type = 'stdio'
+            return 'stdio'
     elif 'gitmcp.io' in target:
         # GitMCP server - must be SSE
-        if req.type != 'sse':
-            logger.warning(f"Auto-correcting connection type from '{req.type}' to 'sse' for GitMCP server", extra={
-                "extra_data": {"target": target, "original_type": req.type}
+        if type != 'sse':
+            logger.warning(f"Auto-correcting connection type from '{type}' to 'sse' for GitMCP server", extra={
+                "extra_data": {"target": target, "original_type": type}
             })
-            req.type = 'sse'
+            return 'sse'
+    return type
+
+@app.post("/api/mcp/connect")
+async def connect_mcp(req: ConnectRequest):
+    start_time = time.time()
+    
+    # Validate and auto-correct connection type
+    req.type = _corrected_connect_type(req.target, req.type)
     
     try:
         result = await manager.connect(req.id, req.target, req.type)
@@ -1304,11 +2022,52 @@ async def connect_mcp(req: ConnectRequest):
         )
         raise
 
+@app.post("/api/mcp/connect_batch")
+async def connect_mcp_batch(req: ConnectBatchRequest):
+    start_time = time.time()
+
+    # Concurrent connects under one id would overwrite each other and leak
+    # the loser's exit stack (and subprocess)
+    seen, duplicates = set(), set()
+    for spec in req.connections:
+        (duplicates if spec.id in seen else seen).add(spec.id)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate connection ids in batch: {', '.join(sorted(duplicates))}")
+
+    for spec in req.connections:
+        spec.type = _corrected_connect_type(spec.target, spec.type)
+
+    results = await manager.connect_many(req.connections)
+
+    response = []
+    for spec, result in zip(req.connections, results):
+        if isinstance(result, HTTPException):
+            response.append({"id": spec.id, "status": "error", "status_code": result.status_code, "detail": result.detail})
+        elif isinstance(result, Exception):
+            response.append({"id": spec.id, "status": "error", "status_code": 500, "detail": str(result)})
+        else:
+            response.append({"id": spec.id, **result})
+
+    duration = time.time() - start_time
+    log_api_request(
+        endpoint="/api/mcp/connect_batch",
+        method="POST",
+        status_code=200,
+        duration=duration
+    )
+
+    return {"results": response}
+
 @app.post("/api/mcp/disconnect/{id}")
 async def disconnect_mcp(id: str):
     await manager.disconnect(id)
     return {"status": "disconnected"}
 
+@app.post("/api/mcp/cache/clear")
+async def clear_mcp_path_caches():
+    _clear_path_caches()
+    return {"status": "cleared"}
+
 @app.get("/api/mcp/resources/list")
 async def list_resources():
     all_resources = []
@@ -1404,36 +2163,110 @@ async def create_session(req: CreateSessionRequest):
 @app.delete("/api/sessions/{id}")
 async def delete_session(id: str):
     db.delete_session(id)
+    forget_session_history(id)
     log_session_event("deleted", id)
     return {"status": "deleted"}
 
 @app.get("/api/sessions/{id}/messages")
 async def get_messages(id: str):
+    await wait_for_db_writes()
     messages = db.get_messages(id)
+    # Images are served separately so loading a session doesn't ship them
+    for msg in messages:
+        if msg.pop('has_image', False):
+            msg['image'] = {"data": f"/api/messages/{msg['id']}/image", "mimeType": ""}
     logger.debug(f"Retrieved {len(messages)} messages for session {id}")
     return messages
 
+@app.get("/api/messages/{id}/image")
+async def get_message_image(id: str):
+    await wait_for_db_writes()
+    image = db.get_message_image(id)
+    data = image.get("data") if isinstance(image, dict) else None
+    if not data:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Regenerated turns re-send the image URL they were given
+    if data.startswith("/api/messages/"):
+        return RedirectResponse(data)
+
+    header, _, encoded = data.partition(",")
+    if not header.startswith("data:") or not header.endswith(";base64"):
+        raise HTTPException(status_code=415, detail="Unsupported image encoding")
+    mime_type = header[5:-7] or image.get("mimeType") or "application/octet-stream"
+    return Response(
+        content=base64.b64decode(encoded),
+        media_type=mime_type,
+        headers={"Cache-Control": "private, max-age=31536000, immutable"}
+    )
+
 @app.post("/api/messages")
 async def save_message(req: SaveMessageRequest):
+    await wait_for_db_writes()
     db.add_message(req.session_id, req.message)
-    logger.debug(f"Message saved", extra={
-        "extra_data": {
-            "session_id": req.session_id,
-            "message_id": req.message.get('id')
-        }
-    })
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Message saved", extra={
+            "extra_data": {
+                "session_id": req.session_id,
+                "message_id": req.message.get('id')
+            }
+        })
     return {"status": "saved"}
 
 # ==========================================
 # 4. DEBUGGER WEBSOCKET
 # ==========================================
+WS_LOG_CHUNK_SIZE = 64 * 1024  # Characters per tool-output message
+
+async def _ws_receive(websocket: WebSocket) -> Dict[str, Any]:
+    """Read one JSON command, accepting text or binary frames."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    return orjson.loads(message.get("bytes") or message.get("text") or b"{}")
+
+def _ws_encode(message: Any) -> bytes:
+    return message if isinstance(message, bytes) else orjson.dumps(message)
+
+async def _ws_sender(websocket: WebSocket, out: asyncio.Queue):
+    """Drain queued outgoing messages, coalescing whatever has piled up into
+    one binary frame of newline-separated JSON documents, up to about
+    WS_LOG_CHUNK_SIZE bytes per frame. Queued bytes are taken as
+    already-encoded JSON.
+
+    Once a send fails (client gone) later messages are discarded, so the
+    task never dies with an unretrieved exception. Every message is marked
+    done after it is sent (or dropped), so producers can `await out.join()`.
+    """
+    closed = False
+    while True:
+        message = await out.get()
+        if closed:
+            out.task_done()
+            continue
+        frame = [_ws_encode(message)]
+        size = len(frame[0])
+        while size < WS_LOG_CHUNK_SIZE and not out.empty():
+            data = _ws_encode(out.get_nowait())
+            frame.append(data)
+            size += len(data) + 1
+        try:
+            await websocket.send_bytes(b"\n".join(frame))
+        except Exception as e:
+            closed = True
+            logger.info("WebSocket send failed, dropping further output: %s", e)
+        for _ in frame:
+            out.task_done()
+
 @app.websocket("/ws/mcp")
 async def mcp_websocket(websocket: WebSocket):
     await websocket.accept()
     logger.info("WebSocket connection accepted")
     
+    out: asyncio.Queue = asyncio.Queue()
+    sender = asyncio.create_task(_ws_sender(websocket, out))
     try:
-        init_data = await websocket.receive_json()
+        init_data = await _ws_receive(websocket)
         if init_data.get("command") != "connect":
             logger.warning("Invalid WebSocket command", extra={
                 "extra_data": {"command": init_data.get("command")}
@@ -1451,14 +2284,13 @@ async def mcp_websocket(websocket: WebSocket):
             read, write = None, None
 
             if conn_type == "stdio":
-                env = os.environ.copy()
+                env = _BASE_ENV
                 if target.endswith(".py"):
                     cmd = sys.executable
                     args = [target]
                 else:
-                    parts = shlex.split(target, posix=sys.platform != "win32")
-                    cmd = shutil.which(parts[0]) or parts[0]
-                    args = parts[1:]
+                    cmd, cmd_args = _resolve_command(target)
+                    args = list(cmd_args)
                
                 server_params = StdioServerParameters(command=cmd, args=args, env=env)
                 read, write = await stack.enter_async_context(stdio_client(server_params))
@@ -1471,64 +2303,113 @@ async def mcp_websocket(websocket: WebSocket):
 
             async with ClientSession(read, write) as session:
                 await session.initialize()
-                await websocket.send_json({"status": "connected", "message": "Connected"})
+                out.put_nowait({"status": "connected", "message": "Connected"})
                 logger.info("WebSocket MCP session established")
-               
-                while True:
-                    try:
-                        msg = await websocket.receive_json()
-                        cmd = msg.get("command")
+                # A server's tool set is fixed for the session, so the
+                # encoded list is built once and reused. Start fetching it
+                # now; the client asks for it right after "connected".
+                tools_payload = None
+                tools_task = asyncio.create_task(session.list_tools())
+                try:
+                    while True:
+                        try:
+                            msg = await _ws_receive(websocket)
+                            cmd = msg.get("command")
                         
-                        logger.debug(f"WebSocket command received", extra={
-                            "extra_data": {"command": cmd}
-                        })
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug(f"WebSocket command received", extra={
+                                    "extra_data": {"command": cmd}
+                                })
                        
-                        if cmd == "list_tools":
-                            tools = await session.list_tools()
-                            await websocket.send_json({
-                                "type": "tools_list",
-                                "data": [
-                                    {
-                                        "name": t.name,
-                                        "description": t.description,
-                                        "schema": t.inputSchema
-                                    }
-                                    for t in tools.tools
-                                ]
-                            })
+                            if cmd == "list_tools":
+                                if tools_payload is None:
+                                    tools = await tools_task
+                                    tools_payload = orjson.dumps({
+                                        "type": "tools_list",
+                                        "data": [
+                                            {
+                                                "name": t.name,
+                                                "description": t.description,
+                                                "schema": t.inputSchema
+                                            }
+                                            for t in tools.tools
+                                        ]
+                                    })
+                                out.put_nowait(tools_payload)
                        
-                        elif cmd == "call_tool":
-                            tool_name = msg.get("name")
-                            tool_args = msg.get("args", {})
-                            
-                            logger.info(f"WebSocket tool call", extra={
-                                "extra_data": {"tool": tool_name, "args": tool_args}
-                            })
+                            elif cmd == "call_tool":
+                                tool_name = msg.get("name")
+                                tool_args = msg.get("args", {})
                             
-                            res = await session.call_tool(tool_name, tool_args)
-                            text = ""
-                            if hasattr(res, 'content') and res.content:
-                                text = "\n".join([c.text for c in res.content if hasattr(c, 'text')])
+                                logger.info(f"WebSocket tool call", extra={
+                                    "extra_data": {"tool": tool_name, "args": tool_args}
+                                })
                             
-                            await websocket.send_json({
-                                "type": "log",
-                                "message": f"Result:\n{text}"
-                            })
+                                res = await session.call_tool(tool_name, tool_args)
+                                # Stream large outputs in ~64 KiB pieces instead of
+                                # joining everything into one string first
+                                pending = ["Result:\n"]
+                                pending_len = 0
+                                sep = ""
+                                for c in (getattr(res, 'content', None) or ()):
+                                    if not hasattr(c, 'text'):
+                                        continue
+                                    pending.append(sep)
+                                    pending.append(c.text)
+                                    pending_len += len(c.text)
+                                    sep = "\n"
+                                    if pending_len >= WS_LOG_CHUNK_SIZE:
+                                        out.put_nowait({"type": "log_chunk", "data": "".join(pending)})
+                                        pending = []
+                                        pending_len = 0
+                                        # Let the sender put this chunk on the
+                                        # wire before building the next one
+                                        await out.join()
+                                if pending:
+                                    out.put_nowait({"type": "log_chunk", "data": "".join(pending)})
                    
-                    except WebSocketDisconnect:
-                        logger.info("WebSocket disconnected")
-                        break
-
+                        except WebSocketDisconnect:
+                            logger.info("WebSocket disconnected")
+                            break
+                finally:
+                    tools_task.cancel()
+
+    except WebSocketDisconnect:
+        logger.info("WebSocket disconnected")
     except Exception as e:
         log_exception("WebSocket error", e)
         try:
             await websocket.close()
         except:
             pass
+    finally:
+        sender.cancel()
 
 # ==========================================
 # STARTUP/SHUTDOWN EVENTS
 # ==========================================
+async def _llm_keepalive():
+    """Open the LLM API connections at startup and keep them warm.
+
+    The first ping runs immediately so the first chat turn skips the TLS
+    handshake; later pings stay inside the pool's keepalive_expiry.
+    """
+    while True:
+        groq_async = get_groq_async()
+        gemini = get_gemini()
+        try:
+            if groq_async:
+                await groq_async.models.list()
+            if gemini:
+                await gemini.aio.models.get(model=GEMINI_MODEL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("LLM keepalive ping failed: %s", e)
+        if LLM_KEEPALIVE_INTERVAL <= 0:
+            return
+        await asyncio.sleep(LLM_KEEPALIVE_INTERVAL)
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("="*60)
@@ -1538,6 +2419,17 @@ async def startup_event():
     logger.info(f"Available Providers: Groq={'✓' if groq_client else '✗'}, Gemini={'✓' if gemini_client else '✗'}")
     logger.info("="*60)
 
+    app.state.groq_async_client = get_groq_async()
+    app.state.gemini_client = get_gemini()
+    # Streamers must share these pooled clients, never build their own
+    assert app.state.groq_async_client is groq_async_client
+    assert app.state.gemini_client is gemini_client
+    app.state.llm_keepalive = asyncio.create_task(_llm_keepalive())
+
+    global _db_write_queue
+    _db_write_queue = asyncio.Queue()
+    app.state.db_writer = asyncio.create_task(_db_writer())
+
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("="*60)
@@ -1549,7 +2441,26 @@ async def shutdown_event():
         await manager.disconnect(conn_id)
     
     logger.info("All MCP connections closed")
+
+    # Let queued message writes land before closing the database
+    await wait_for_db_writes()
+    app.state.db_writer.cancel()
+    db.close()
+
+    # Release pooled HTTP connections held by the LLM clients
+    app.state.llm_keepalive.cancel()
+    try:
+        if groq_async_client:
+            await groq_async_client.close()
+        if groq_client:
+            groq_client.close()
+        gemini_aio = getattr(gemini_client, "aio", None)
+        if gemini_aio is not None and hasattr(gemini_aio, "aclose"):
+            await gemini_aio.aclose()
+    except Exception as e:
+        log_exception("LLM client shutdown failed", e)
     logger.info("="*60)
+    stop_log_listener()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,10 +1,53 @@
 import sqlite3
-import json
+import orjson
 import uuid
-from typing import List, Dict, Any
-from datetime import datetime
+import threading
+from typing import List, Dict, Any, Optional
+import time
+ 
+from logger import logger
  
 DB_NAME = "chat.db"
+FLUSH_INTERVAL = 0.02  # Seconds a new message may wait for its batch commit
+FLUSH_MAX_ROWS = 64
+ 
+_INSERT_MESSAGE = '''
+  INSERT OR REPLACE INTO messages
+  (id, session_id, role, content, image_data, tool_calls, is_tool_result, tool_call_id, thought_signature, created_at, tool_name, original_len)
+  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SELECT_MESSAGES = '''
+  SELECT id, role, content, image_data IS NOT NULL, tool_calls, is_tool_result, tool_call_id,
+         thought_signature, created_at, tool_name, original_len
+  FROM messages WHERE session_id = ? ORDER BY created_at ASC
+'''
+ 
+_ts_second = (0, "")
+ 
+def _now_iso() -> str:
+  """Local time in isoformat(), always with microseconds.
+
+  The date/time part is only re-rendered when the second changes.
+  """
+  global _ts_second
+  sec, ns = divmod(time.time_ns(), 1_000_000_000)
+  cached_sec, prefix = _ts_second
+  if sec != cached_sec:
+    prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(sec))
+    _ts_second = (sec, prefix)
+  return f"{prefix}.{ns // 1000:06d}"
+ 
+_SQLITE_TYPES = (type(None), int, float, str, bytes)
+ 
+def _check_row(row: tuple):
+  """Raise the error SQLite would raise when binding row, up front."""
+  for index, value in enumerate(row):
+    if not isinstance(value, _SQLITE_TYPES):
+      raise sqlite3.ProgrammingError(
+        f"Error binding parameter {index + 1}: type '{type(value).__name__}' is not supported"
+      )
+    if isinstance(value, int) and not -2**63 <= value < 2**63:
+      raise OverflowError(f"Python int too large to convert to SQLite INTEGER (parameter {index + 1})")
  
 def init_db():
   """Initialize the database tables."""
@@ -25,16 +68,24 @@ def init_db():
       session_id TEXT,
       role TEXT,
       content TEXT,
-      image_data TEXT,
-      tool_calls TEXT,
+      image_data BLOB,
+      tool_calls BLOB,
       is_tool_result BOOLEAN DEFAULT 0,
       tool_call_id TEXT,
       thought_signature TEXT,
       created_at TEXT,
+      tool_name TEXT,
+      original_len INTEGER,
       FOREIGN KEY(session_id) REFERENCES sessions(id) ON DELETE CASCADE
     )
   ''')
  
+  # Migrate older databases
+  columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+  for column, col_type in (('tool_name', 'TEXT'), ('original_len', 'INTEGER')):
+    if column not in columns:
+      conn.execute(f"ALTER TABLE messages ADD COLUMN {column} {col_type}")
+ 
   # Ensure indexes exist
   conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id);")
   conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions(created_at);")
@@ -42,96 +93,199 @@ def init_db():
   conn.commit()
   conn.close()
  
+def _connect(**kwargs) -> sqlite3.Connection:
+  conn = sqlite3.connect(DB_NAME, check_same_thread=False, **kwargs)
+  conn.row_factory = sqlite3.Row
+  # Per-connection settings; with WAL, NORMAL only syncs at checkpoints
+  conn.execute("PRAGMA synchronous=NORMAL;")
+  conn.execute("PRAGMA temp_store=MEMORY;")
+  conn.execute("PRAGMA mmap_size=268435456;")
+  return conn
+ 
 class ChatDatabase:
+  """SQLite access for the whole app.
+
+  Writes go through one long-lived connection guarded by a lock (SQLite
+  only allows one writer anyway). Reads use a connection per thread, so
+  under WAL they run concurrently with each other and with the writer.
+
+  New messages are buffered and committed in batches (after FLUSH_INTERVAL
+  or FLUSH_MAX_ROWS) so a burst costs one commit. Every other method flushes
+  the buffer first, so reads always see buffered messages.
+  """
   def __init__(self):
-    self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-    self.conn.row_factory = sqlite3.Row
+    self.conn = _connect()
+    self._lock = threading.RLock()
+    self._pending: List[tuple] = []
+    self._flush_timer: Optional[threading.Timer] = None
+    self._tls = threading.local()
+    self._readers: List[sqlite3.Connection] = []
+ 
+  def _reader(self) -> sqlite3.Connection:
+    conn = getattr(self._tls, "conn", None)
+    if conn is None:
+      conn = self._tls.conn = _connect(isolation_level=None)
+      with self._lock:
+        self._readers.append(conn)
+    return conn
+ 
+  def close(self):
+    with self._lock:
+      self._flush_locked()
+      self.conn.close()
+      for conn in self._readers:
+        conn.close()
+      self._readers.clear()
+ 
+  def flush(self):
+    with self._lock:
+      self._flush_locked()
+ 
+  def _flush_locked(self):
+    if self._flush_timer is not None:
+      self._flush_timer.cancel()
+      self._flush_timer = None
+    if not self._pending:
+      return
+    rows, self._pending = self._pending, []
+    try:
+      self.conn.executemany(_INSERT_MESSAGE, rows)
+      self.conn.commit()
+      return
+    except Exception as e:
+      self.conn.rollback()
+      logger.warning("Batched message insert failed, retrying rows individually", extra={
+        "extra_data": {"rows": len(rows), "error": str(e)}
+      })
+    # One bad row must not take the rest of the batch with it
+    for row in rows:
+      try:
+        self.conn.execute(_INSERT_MESSAGE, row)
+      except Exception as e:
+        logger.error("Dropped message that could not be stored", extra={
+          "extra_data": {"message_id": row[0], "session_id": row[1], "error": str(e)}
+        })
+    self.conn.commit()
  
   def get_sessions(self) -> List[Dict]:
-    c = self.conn.cursor()
-    c.execute("SELECT * FROM sessions ORDER BY created_at DESC")
-    return [dict(row) for row in c.fetchall()]
+    self.flush()
+    c = self._reader().cursor()
+    c.row_factory = None
+    c.execute("SELECT id, title, created_at FROM sessions ORDER BY created_at DESC")
+    return [
+      {"id": session_id, "title": title, "created_at": created_at}
+      for session_id, title, created_at in c.fetchall()
+    ]
  
   def create_session(self, title: str) -> str:
     session_id = str(uuid.uuid4())
-    created_at = datetime.now().isoformat()
-    c = self.conn.cursor()
-    c.execute("INSERT INTO sessions (id, title, created_at) VALUES (?, ?, ?)",
-         (session_id, title, created_at))
-    self.conn.commit()
+    created_at = _now_iso()
+    with self._lock:
+      self._flush_locked()
+      c = self.conn.cursor()
+      c.execute("INSERT INTO sessions (id, title, created_at) VALUES (?, ?, ?)",
+           (session_id, title, created_at))
+      self.conn.commit()
     return session_id
  
   def delete_session(self, session_id: str):
-    c = self.conn.cursor()
-    c.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-    c.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
-    self.conn.commit()
+    with self._lock:
+      self._flush_locked()
+      c = self.conn.cursor()
+      c.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+      c.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+      self.conn.commit()
  
   def get_messages(self, session_id: str) -> List[Dict]:
-    c = self.conn.cursor()
-    c.execute("SELECT * FROM messages WHERE session_id = ? ORDER BY created_at ASC", (session_id,))
+    """Messages in order. Images are not loaded: messages that have one get
+    has_image=True and the image is fetched with get_message_image()."""
+    self.flush()
+    c = self._reader().cursor()
+    c.row_factory = None
+    c.execute(_SELECT_MESSAGES, (session_id,))
     rows = c.fetchall()
     messages = []
    
-    for row in rows:
-      msg = dict(row)
-     
-      # --- SAFETY FIX: Sanitize potential bytes ---
-      # FastAPI crashes if it tries to encode raw bytes that aren't valid utf-8
-      for k, v in msg.items():
-          if isinstance(v, bytes):
-              try:
-                  msg[k] = v.decode('utf-8')
-              except UnicodeDecodeError:
-                  # If binary junk, force string representation to prevent crash
-                  msg[k] = str(v)
- 
-      # Deserialize JSON fields
-      if msg.get('image_data'):
+    for (msg_id, role, content, has_image, tool_calls, is_tool_result,
+         tool_call_id, thought_signature, created_at, tool_name, original_len) in rows:
+      # Rows written before add_message decoded it may hold raw bytes,
+      # which FastAPI cannot encode
+      if isinstance(thought_signature, bytes):
         try:
-            msg['image'] = json.loads(msg['image_data'])
-        except:
-            msg['image'] = None
+          thought_signature = thought_signature.decode('utf-8')
+        except UnicodeDecodeError:
+          thought_signature = str(thought_signature)
+ 
+      msg = {
+        'id': msg_id,
+        'role': role,
+        'content': content,
+        'is_tool_result': is_tool_result,
+        'tool_call_id': tool_call_id,
+        'thought_signature': thought_signature,
+        'created_at': created_at,
+        'tool_name': tool_name,
+        'original_len': original_len,
+      }
  
-      if msg.get('tool_calls'):
+      if has_image:
+        msg['has_image'] = True
+ 
+      # Deserialize JSON fields
+      if tool_calls:
         try:
-            msg['toolCalls'] = json.loads(msg['tool_calls'])
-        except:
+            msg['toolCalls'] = orjson.loads(tool_calls)
+        except orjson.JSONDecodeError:
             msg['toolCalls'] = []
-       
-      # Clean up raw columns
-      if 'image_data' in msg: del msg['image_data']
-      if 'tool_calls' in msg: del msg['tool_calls']
      
       messages.append(msg)
      
     return messages
  
+  def get_message_image(self, msg_id: str) -> Optional[Dict]:
+    self.flush()
+    c = self._reader().cursor()
+    c.execute("SELECT image_data FROM messages WHERE id = ?", (msg_id,))
+    row = c.fetchone()
+    if not row or not row[0]:
+      return None
+    try:
+      return orjson.loads(row[0])
+    except orjson.JSONDecodeError:
+      return None
+ 
   def add_message(self, session_id: str, msg_data: Dict[str, Any]):
-    c = self.conn.cursor()
-     
     msg_id = msg_data.get('id', str(uuid.uuid4()))
     role = msg_data.get('role', 'user')
     content = msg_data.get('content', '')
     is_tool_result = msg_data.get('is_tool_result', False)
     tool_call_id = msg_data.get('tool_call_id', None)
+    tool_name = msg_data.get('tool_name')
+    original_len = msg_data.get('original_len')
    
     # Ensure thought_signature is a string, not bytes
     thought_signature = msg_data.get('thought_signature')
     if isinstance(thought_signature, bytes):
         thought_signature = thought_signature.decode('utf-8', errors='ignore')
  
+    # Pre-encode tool call arguments once so history rebuilds can reuse them
+    tool_calls = msg_data.get('toolCalls')
+    if tool_calls:
+      tool_calls = [
+        {**tc, 'args_json': orjson.dumps(tc['args']).decode()}
+        if isinstance(tc.get('args'), dict) and 'args_json' not in tc else tc
+        for tc in tool_calls
+      ]
+ 
     # Serialize complex objects
-    image_json = json.dumps(msg_data.get('image')) if msg_data.get('image') else None
-    tool_json = json.dumps(msg_data.get('toolCalls')) if msg_data.get('toolCalls') else None
+    image = msg_data.get('image')
+    # Stored as orjson bytes (BLOB); orjson.loads reads these and legacy TEXT rows alike
+    image_json = orjson.dumps(image) if image else None
+    tool_json = orjson.dumps(tool_calls) if tool_calls else None
      
-    created_at = datetime.now().isoformat()
+    created_at = _now_iso()
  
-    c.execute('''
-      INSERT OR REPLACE INTO messages
-      (id, session_id, role, content, image_data, tool_calls, is_tool_result, tool_call_id, thought_signature, created_at)
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    row = (
       msg_id,
       session_id,
       role,
@@ -141,12 +295,26 @@ class ChatDatabase:
       is_tool_result,
       tool_call_id,
       thought_signature,
-      created_at
-    ))
-    self.conn.commit()
+      created_at,
+      tool_name,
+      original_len
+    )
+    # Rows are inserted later by the batch flush, so reject bad values here
+    # where the caller still gets the error
+    _check_row(row)
+    with self._lock:
+      self._pending.append(row)
+      if len(self._pending) >= FLUSH_MAX_ROWS:
+        self._flush_locked()
+      elif self._flush_timer is None:
+        self._flush_timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
     return msg_id
  
   def update_session_title(self, session_id: str, title: str):
-    c = self.conn.cursor()
-    c.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
-    self.conn.commit()
\ No newline at end of file
+    with self._lock:
+      self._flush_locked()
+      c = self.conn.cursor()
+      c.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+      self.conn.commit()
\ No newline at end of file
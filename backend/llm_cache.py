@@ -0,0 +1,141 @@
+"""
+Response cache in front of the LLM providers.
+
+Layer 1 is an exact-match cache keyed on the model, the connected tool set and
+the conversation so far. Layer 2 is optional (requires sentence-transformers
+and LLM_SEMANTIC_CACHE_MODEL): when the conversation up to the latest user
+message is identical, that message is matched against recent ones by
+embedding cosine similarity.
+
+Entries store the SSE frames the provider streamed, so a hit can be replayed
+to the client verbatim.
+"""
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from logger import logger
+
+CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "600"))  # Seconds, 0 disables
+CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "512"))
+SEMANTIC_MODEL = os.environ.get("LLM_SEMANTIC_CACHE_MODEL")
+SEMANTIC_THRESHOLD = float(os.environ.get("LLM_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_RING_SIZE = 256
+
+_EXACT_CACHE: "OrderedDict[str, tuple[float, List[Any]]]" = OrderedDict()
+_SEMANTIC_RING: deque = deque(maxlen=SEMANTIC_RING_SIZE)
+
+stats: Dict[str, int] = {
+    "exact_hits": 0,
+    "semantic_hits": 0,
+    "misses": 0,
+    "stores": 0,
+}
+
+_embedder = None
+if SEMANTIC_MODEL and CACHE_TTL > 0:
+    try:
+        from sentence_transformers import SentenceTransformer
+        _embedder = SentenceTransformer(SEMANTIC_MODEL)
+        logger.info("Semantic LLM cache enabled", extra={
+            "extra_data": {"model": SEMANTIC_MODEL, "threshold": SEMANTIC_THRESHOLD}
+        })
+    except Exception as e:
+        logger.warning("Semantic LLM cache unavailable, using exact match only", extra={
+            "extra_data": {"model": SEMANTIC_MODEL, "error": str(e)}
+        })
+
+def enabled() -> bool:
+    return CACHE_TTL > 0
+
+def _canonical(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop per-row fields (ids, timestamps) that differ between identical turns."""
+    return {
+        "role": msg.get("role"),
+        "content": msg.get("content") or "",
+        "is_tool_result": bool(msg.get("is_tool_result")),
+        "tool_calls": [
+            [tc.get("name"), tc.get("args")] for tc in (msg.get("toolCalls") or [])
+        ],
+    }
+
+def _digest(*parts: bytes) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(part)
+        h.update(b"\x00")
+    return h.hexdigest()
+
+class CacheKey:
+    def __init__(self, model: str, tools_fingerprint: str, history: List[Dict[str, Any]]):
+        canonical = [_canonical(m) for m in history]
+        head = f"{model}\x00{tools_fingerprint}".encode()
+
+        self.exact = _digest(head, orjson.dumps(canonical, option=orjson.OPT_SORT_KEYS))
+
+        # Semantic matching only applies when the turn ends in a plain user message
+        self.prefix: Optional[str] = None
+        self.user_text: Optional[str] = None
+        last = canonical[-1] if canonical else None
+        if last and last["role"] == "user" and not last["is_tool_result"] and last["content"]:
+            self.prefix = _digest(head, orjson.dumps(canonical[:-1], option=orjson.OPT_SORT_KEYS))
+            self.user_text = last["content"]
+        self.embedding = None
+
+def _get_exact(key: str) -> Optional[List[Any]]:
+    entry = _EXACT_CACHE.get(key)
+    if entry is None:
+        return None
+    stored_at, frames = entry
+    if time.time() - stored_at > CACHE_TTL:
+        del _EXACT_CACHE[key]
+        return None
+    _EXACT_CACHE.move_to_end(key)
+    return frames
+
+async def lookup(key: CacheKey) -> Optional[List[Any]]:
+    """Return cached frames for this turn, or None on a miss."""
+    frames = _get_exact(key.exact)
+    if frames is not None:
+        stats["exact_hits"] += 1
+        return frames
+
+    if _embedder is not None and key.user_text:
+        key.embedding = await asyncio.to_thread(
+            _embedder.encode, key.user_text, normalize_embeddings=True
+        )
+        for prefix, embedding, exact in reversed(_SEMANTIC_RING):
+            if prefix != key.prefix:
+                continue
+            if float(embedding @ key.embedding) >= SEMANTIC_THRESHOLD:
+                frames = _get_exact(exact)
+                if frames is not None:
+                    stats["semantic_hits"] += 1
+                    return frames
+
+    stats["misses"] += 1
+    return None
+
+def store(key: CacheKey, frames: List[Any]):
+    _EXACT_CACHE[key.exact] = (time.time(), frames)
+    _EXACT_CACHE.move_to_end(key.exact)
+    while len(_EXACT_CACHE) > CACHE_MAX_ENTRIES:
+        _EXACT_CACHE.popitem(last=False)
+
+    if key.embedding is not None:
+        _SEMANTIC_RING.append((key.prefix, key.embedding, key.exact))
+
+    stats["stores"] += 1
+
+def metrics() -> Dict[str, Any]:
+    return {
+        **stats,
+        "entries": len(_EXACT_CACHE),
+        "ttl_seconds": CACHE_TTL,
+        "semantic_enabled": _embedder is not None,
+    }
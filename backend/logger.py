@@ -1,9 +1,12 @@
 import logging
 import sys
 import json
-from datetime import datetime
+import orjson
+import queue
+import atexit
+from datetime import datetime, timezone
 from pathlib import Path
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler, QueueHandler, QueueListener
 from typing import Any, Dict, Optional
 from contextlib import contextmanager
 import time
@@ -34,22 +37,32 @@ class ColoredFormatter(logging.Formatter):
         'CRITICAL': '🚨',
     }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Everything before the timestamp only depends on the level
+        self._prefix = {
+            level: f"{self.EMOJI[level]} {color}{self.BOLD}{level:8s}{self.RESET} {self.DIM}["
+            for level, color in self.COLORS.items()
+        }
+        self._locations: Dict[tuple, str] = {}
+    
     def format(self, record: logging.LogRecord) -> str:
-        # Add emoji and color
-        emoji = self.EMOJI.get(record.levelname, '')
-        color = self.COLORS.get(record.levelname, self.RESET)
-        
-        # Format timestamp
-        timestamp = datetime.fromtimestamp(record.created).strftime('%H:%M:%S')
-        
-        # Color the level name
-        level_colored = f"{color}{self.BOLD}{record.levelname:8s}{self.RESET}"
+        levelname = record.levelname
+        prefix = self._prefix.get(levelname)
+        if prefix is None:
+            prefix = f" {self.RESET}{self.BOLD}{levelname:8s}{self.RESET} {self.DIM}["
         
         # Dim the module/function info
-        location = f"{self.DIM}{record.name}:{record.funcName}{self.RESET}"
+        key = (record.name, record.funcName)
+        location = self._locations.get(key)
+        if location is None:
+            if len(self._locations) >= 512:
+                self._locations.clear()
+            location = self._locations[key] = f"]{self.RESET} {self.DIM}{record.name}:{record.funcName}{self.RESET} | "
         
         # Build final message
-        message = f"{emoji} {level_colored} {self.DIM}[{timestamp}]{self.RESET} {location} | {record.getMessage()}"
+        timestamp = time.strftime('%H:%M:%S', time.localtime(record.created))
+        message = f"{prefix}{timestamp}{location}{record.getMessage()}"
         
         # Add exception info if present
         if record.exc_info:
@@ -62,7 +75,7 @@ class StructuredJSONFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
-            "timestamp": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
             "level": record.levelname,
             "logger": record.name,
             "module": record.module,
@@ -79,18 +92,45 @@ class StructuredJSONFormatter(logging.Formatter):
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
         
-        return json.dumps(log_data, ensure_ascii=False)
+        # orjson writes UTF-8 (no ASCII escaping) and renders the UTC
+        # timestamp with a Z suffix; default=str keeps odd extra values and
+        # OPT_NON_STR_KEYS stringifies int/other dict keys like json did
+        try:
+            return orjson.dumps(
+                log_data, default=str,
+                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+            ).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits, which default= never sees
+            log_data["timestamp"] = log_data["timestamp"].isoformat().replace("+00:00", "Z")
+            return json.dumps(log_data, default=str, ensure_ascii=False)
+
+class LocalQueueHandler(QueueHandler):
+    """QueueHandler for an in-process listener.
+
+    The stock prepare() formats the record (traceback included) into msg so it
+    can be pickled; here the record only crosses a thread, so just resolve the
+    message args and let the real handlers do the formatting.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 class RequestIDFilter(logging.Filter):
     """Add request ID to logs for request tracing"""
     def __init__(self):
         super().__init__()
-        self.request_id = None
+        self.request_id = "N/A"
     
     def filter(self, record):
-        record.request_id = getattr(self, 'request_id', 'N/A')
+        record.request_id = self.request_id
         return True
 
+# One shared instance; it is attached once, on the queue handler, so it
+# runs on the calling thread for every record
+request_id_filter = RequestIDFilter()
+
 def setup_logger(
     name: str = "mcp_station",
     level: int = logging.INFO,
@@ -110,18 +150,20 @@ def setup_logger(
     """
     
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)  # Capture everything, handlers will filter
     
     # Clear existing handlers to avoid duplicates
     if logger.handlers:
         logger.handlers.clear()
+    stop_log_listener()
+    
+    handlers = []
     
     # === Console Handler (Colored, Human-Readable) ===
     if log_to_console:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(level)
         console_handler.setFormatter(ColoredFormatter())
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
     
     if log_to_file:
         # === Main Application Log (JSON, Structured) ===
@@ -133,7 +175,7 @@ def setup_logger(
         )
         app_handler.setLevel(logging.INFO)
         app_handler.setFormatter(StructuredJSONFormatter())
-        logger.addHandler(app_handler)
+        handlers.append(app_handler)
         
         # === Error Log (Errors Only) ===
         error_handler = RotatingFileHandler(
@@ -144,7 +186,7 @@ def setup_logger(
         )
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(StructuredJSONFormatter())
-        logger.addHandler(error_handler)
+        handlers.append(error_handler)
         
         # === Debug Log (Everything, Time-Rotated Daily) ===
         if enable_debug_file:
@@ -157,13 +199,40 @@ def setup_logger(
             )
             debug_handler.setLevel(logging.DEBUG)
             debug_handler.setFormatter(StructuredJSONFormatter())
-            logger.addHandler(debug_handler)
+            handlers.append(debug_handler)
+    
+    # Capture down to the most verbose handler so isEnabledFor() guards
+    # skip work for records that no handler would accept
+    logger.setLevel(min((h.level for h in handlers), default=level))
+    
+    # === Deferred Output ===
+    # Callers (mostly the event loop) only enqueue the record; formatting and
+    # console/file I/O happen on the listener thread
+    if handlers:
+        global _listener
+        log_queue = queue.SimpleQueue()
+        queue_handler = LocalQueueHandler(log_queue)
+        queue_handler.addFilter(request_id_filter)
+        logger.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
     
     # Prevent propagation to root logger
     logger.propagate = False
     
     return logger
 
+_listener: Optional[QueueListener] = None
+
+def stop_log_listener():
+    """Flush queued records and stop the background logging thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_log_listener)
+
 # Global logger instance
 logger = setup_logger()
 
@@ -176,18 +245,20 @@ def log_execution_time(operation: str, level: int = logging.INFO):
     try:
         yield
     finally:
-        duration = time.time() - start
-        logger.log(
-            level,
-            f"{operation} completed",
-            extra={
-                "extra_data": {
-                    "operation": operation,
-                    "duration_ms": round(duration * 1000, 2),
-                    "duration_s": round(duration, 3)
+        # No early return here: it would swallow the block's exception
+        if logger.isEnabledFor(level):
+            duration = time.time() - start
+            logger.log(
+                level,
+                f"{operation} completed",
+                extra={
+                    "extra_data": {
+                        "operation": operation,
+                        "duration_ms": round(duration * 1000, 2),
+                        "duration_s": round(duration, 3)
+                    }
                 }
-            }
-        )
+            )
 
 # === Specialized Logging Functions ===
 
@@ -204,6 +275,8 @@ def log_mcp_connection(
 ):
     """Log MCP server connection attempts with rich metadata"""
     level = logging.INFO if success else logging.ERROR
+    if not logger.isEnabledFor(level):
+        return
     status = "succeeded" if success else "failed"
     
     message = f"MCP connection {status}: {connection_id}"
@@ -232,10 +305,17 @@ def log_tool_execution(
     result: Optional[str],
     duration: float,
     success: bool,
-    error: Optional[str] = None
+    error: Optional[str] = None,
+    exc: Optional[Exception] = None
 ):
-    """Log tool execution with comprehensive details"""
+    """Log tool execution with comprehensive details.
+
+    Pass ``exc`` when the call raised so the traceback is attached to this
+    record instead of emitting a separate exception log.
+    """
     level = logging.INFO if success else logging.ERROR
+    if not logger.isEnabledFor(level):
+        return
     status = "succeeded" if success else "failed"
     
     message = f"Tool execution {status}: {tool_name}"
@@ -255,8 +335,10 @@ def log_tool_execution(
     
     if error:
         extra_data["error"] = error
+    if exc is not None:
+        extra_data["exception_type"] = type(exc).__name__
     
-    logger.log(level, message, extra={"extra_data": extra_data})
+    logger.log(level, message, extra={"extra_data": extra_data}, exc_info=exc)
 
 def log_llm_request(
     provider: str,
@@ -271,6 +353,8 @@ def log_llm_request(
 ):
     """Log LLM API requests with token usage and cost estimation"""
     level = logging.INFO if success else logging.ERROR
+    if not logger.isEnabledFor(level):
+        return
     
     message = f"LLM request: {provider}/{model}"
     
@@ -301,6 +385,8 @@ def log_api_request(
 ):
     """Log HTTP API requests"""
     level = logging.INFO if 200 <= status_code < 400 else logging.ERROR
+    if not logger.isEnabledFor(level):
+        return
     
     message = f"{method} {endpoint} -> {status_code}"
     
@@ -324,6 +410,8 @@ def log_session_event(
     details: Optional[Dict[str, Any]] = None
 ):
     """Log chat session events (create, delete, select)"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
     message = f"Session {event_type}: {session_id}"
     
     extra_data = {
@@ -358,6 +446,8 @@ def log_startup_info(
 
 def log_exception(message: str, exc: Exception, **kwargs):
     """Log an exception with context"""
+    if not logger.isEnabledFor(logging.ERROR):
+        return
     logger.exception(
         message,
         extra={
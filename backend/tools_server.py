@@ -1,4 +1,6 @@
 # tools_server.py
+import os
+import base64
 import hashlib
 import uuid
 import secrets
@@ -8,6 +10,14 @@ from datetime import datetime, timedelta
 from mcp.server.fastmcp import FastMCP
  
 mcp = FastMCP("Swiss-Army-Knife")
+
+_ALLOWED_HASHES = frozenset(hashlib.algorithms_guaranteed)
+
+_DATE_FMT = """📅 **Date Calculation:**
+- **Current Time:** {now}
+- **Target Date ({offset} days):** {target}
+- **Day of Week:** {weekday}
+"""
  
 # --- TOOL 1: Password Generator (True Randomness) ---
 @mcp.tool()
@@ -21,8 +31,15 @@ def generate_secure_password(length: int = 16, include_symbols: bool = True) ->
     chars = string.ascii_letters + string.digits
     if include_symbols:
         chars += "!@#$%^&*()_+-="
-       
-    password = ''.join(secrets.choice(chars) for _ in range(length))
+    alphabet = chars.encode()
+   
+    # One entropy read per pass; bytes at or above `limit` are rejected so
+    # every character stays equally likely
+    limit = 256 - 256 % len(alphabet)
+    picked = bytearray()
+    while len(picked) < length:
+        picked.extend(b for b in secrets.token_bytes(length * 2) if b < limit)
+    password = bytes(alphabet[b % len(alphabet)] for b in picked[:length]).decode()
     return f"🔑 **Generated Password:** `{password}`"
  
 # --- TOOL 2: Text Hashing (Impossible for LLMs) ---
@@ -34,12 +51,35 @@ def calculate_hash(text: str, algorithm: str = "sha256") -> str:
     Use this to verify data integrity or generate IDs.
     """
     try:
-        if algorithm.lower() not in hashlib.algorithms_guaranteed:
+        algo = algorithm.lower()
+        if algo not in _ALLOWED_HASHES:
             return f"Error: Algorithm '{algorithm}' not supported."
            
-        h = hashlib.new(algorithm.lower())
+        h = hashlib.new(algo)
         h.update(text.encode('utf-8'))
-        return f"🧮 **{algorithm.upper()} Hash:**\n`{h.hexdigest()}`"
+        return f"🧮 **{algo.upper()} Hash:**\n`{h.hexdigest()}`"
+    except Exception as e:
+        return str(e)
+ 
+# --- TOOL 2b: Binary Hashing ---
+@mcp.tool()
+def calculate_hash_bytes(data_b64: str, algorithm: str = "sha256") -> str:
+    """
+    Calculates the hash of binary data given as base64.
+    Supported algorithms: md5, sha1, sha256, sha512.
+    Use this for file contents or other non-text data.
+    """
+    try:
+        algo = algorithm.lower()
+        if algo not in _ALLOWED_HASHES:
+            return f"Error: Algorithm '{algorithm}' not supported."
+       
+        raw = base64.b64decode(data_b64, validate=True)
+        # One update over the whole buffer lets OpenSSL use its
+        # hardware-accelerated (e.g. SHA-NI) routines
+        h = hashlib.new(algo)
+        h.update(memoryview(raw))
+        return f"🧮 **{algo.upper()} Hash ({len(raw):,} bytes):**\n`{h.hexdigest()}`"
     except Exception as e:
         return str(e)
  
@@ -50,7 +90,11 @@ def generate_uuid(count: int = 1) -> str:
     Generates random UUIDs (version 4).
     Useful for developers needing unique database keys.
     """
-    ids = [str(uuid.uuid4()) for _ in range(min(count, 10))]
+    n = max(min(count, 10), 0)
+    # One entropy read for the whole batch; version=4 sets the version and
+    # variant bits exactly as uuid4() would
+    buf = os.urandom(16 * n)
+    ids = [str(uuid.UUID(bytes=buf[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
     return "🆔 **UUIDs:**\n" + "\n".join([f"- `{i}`" for i in ids])
  
 # --- TOOL 4: Date Calculator ---
@@ -63,11 +107,12 @@ def date_calculation(days_offset: int, format: str = "%Y-%m-%d") -> str:
     now = datetime.now()
     future = now + timedelta(days=days_offset)
    
-    return f"""📅 **Date Calculation:**
-- **Current Time:** {now.strftime("%Y-%m-%d %H:%M:%S")}
-- **Target Date ({days_offset} days):** {future.strftime(format)}
-- **Day of Week:** {future.strftime("%A")}
-"""
+    return _DATE_FMT.format_map({
+        "now": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "offset": days_offset,
+        "target": future.strftime(format),
+        "weekday": future.strftime("%A"),
+    })
  
 # --- PROMPT: Generate Developer Credentials ---
 @mcp.prompt()
@@ -66,6 +66,9 @@ export const MCPTester: React.FC = () => {
     const wsUrl = `${protocol}//${window.location.host}/ws/mcp`;
    
     const ws = new WebSocket(wsUrl);
+    // Server sends binary frames holding one or more newline-separated JSON messages
+    ws.binaryType = 'arraybuffer';
+    const decoder = new TextDecoder();
    
     ws.onopen = () => {
       ws.send(JSON.stringify({
@@ -75,9 +78,7 @@ export const MCPTester: React.FC = () => {
       }));
     };
  
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-     
+    const handleMessage = (data: any) => {
       if (data.error) {
         addLog(data.error, true);
         setIsConnected(false);
@@ -91,6 +92,14 @@ export const MCPTester: React.FC = () => {
       else if (data.type === "resources_list") setResources(data.data);
       else if (data.type === "prompts_list") setPrompts(data.data);
       else if (data.type === "log") addLog(data.message);
+      else if (data.type === "log_chunk") addLog(data.data);
+    };
+
+    ws.onmessage = (event) => {
+      const raw = typeof event.data === 'string' ? event.data : decoder.decode(event.data);
+      for (const line of raw.split('\n')) {
+        if (line) handleMessage(JSON.parse(line));
+      }
     };
  
     ws.onclose = () => {